@@ -119,10 +119,19 @@ scheduler_events = {
     "cron": {
         "0 12 * * *": [
             "sms_campaign.sms_campaign.doctype.sms_campaign.sms_campaign.send_sheduled_sms"
+		],
+		"* * * * *": [
+			"sms_campaign.sms_campaign.drip.enqueue_due_slices",
+			"sms_campaign.sms_campaign.dlr.flush_delivery_receipts"
 		]
 	}
 }
 
+# runs are cleared through Log Settings
+default_log_clearing_doctypes = {
+	"SMS Campaign Run": 90,
+}
+
 # scheduler_events = {
 #	"all": [
 #		"sms_campaign.tasks.all"
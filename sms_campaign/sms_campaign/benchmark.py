@@ -0,0 +1,198 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""Offline throughput benchmark for the campaign dispatch paths.
+
+Gateways are replaced by a local stand-in with configurable latency and error
+rate, audiences are generated by MariaDB's sequence engine and run summaries are
+not saved, so nothing is written to the site. Peak memory is the Python heap
+peak of each run as traced by tracemalloc, which slows the run down; pass
+`trace_memory=False` for throughput-only numbers. Run against a development
+site with:
+
+	bench --site <site> execute sms_campaign.sms_campaign.benchmark.run --kwargs "{'sizes': [10000]}"
+"""
+
+import random
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import frappe
+
+SIZES = (10_000, 100_000, 1_000_000)
+CHANNELS = ("SMS", "Email", "Raven")
+
+AUDIENCE_QUERY = """
+	select
+		seq as id,
+		concat('07', lpad(seq, 8, '0')) as mobile,
+		concat('customer', seq, '@example.com') as email,
+		concat('bench-channel-', seq mod 100) as channel_id,
+		concat('Customer ', seq) as customer_name,
+		seq * 10 as amount
+	from seq_1_to_{size}
+"""
+
+TEMPLATE = "Dear {{ customer_name }}, your balance is KES {{ amount }}. Ref {{ id }}."
+SUBJECT = "Statement {{ id }}"
+
+
+class GatewayError(Exception):
+	pass
+
+
+class FakeGateway:
+	"""Stands in for the SMS, Email and Raven gateways.
+
+	Every call sleeps for `latency` seconds (plus up to `jitter` seconds) and
+	fails with `GatewayError` at `error_rate`.
+	"""
+
+	def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.random = random.Random(seed)
+		self.calls = 0
+		self.failures = 0
+
+		# Raven Bot interface
+		self.name = "Benchmark Bot"
+		self.raven_user = "Benchmark Bot"
+
+	def call(self, *args, **kwargs):
+		self.calls += 1
+		delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+		if delay:
+			time.sleep(delay)
+
+		if self.error_rate and self.random.random() < self.error_rate:
+			self.failures += 1
+			raise GatewayError("Simulated gateway failure")
+
+	send_sms = call
+	sendmail = call
+	send_message = call
+	send_direct_message = call
+
+
+class RoundTripCounter:
+	"""Counts statements issued on the current database connection."""
+
+	def __init__(self):
+		self.count = 0
+
+	def wrap(self, fn):
+		def wrapper(*args, **kwargs):
+			self.count += 1
+			return fn(*args, **kwargs)
+
+		return wrapper
+
+
+def run(
+	sizes=SIZES, channels=CHANNELS, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, trace_memory=True
+):
+	results = []
+	for size in sizes:
+		for channel in channels:
+			results.append(
+				run_channel(
+					channel,
+					size,
+					latency=latency,
+					jitter=jitter,
+					error_rate=error_rate,
+					seed=seed,
+					trace_memory=trace_memory,
+				)
+			)
+
+	print_results(results)
+	return results
+
+
+def run_channel(channel, size, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, trace_memory=True):
+	from sms_campaign.sms_campaign import queue
+	from sms_campaign.sms_campaign.doctype.sms_campaign import sms_campaign
+	from sms_campaign.sms_campaign.metrics import CampaignRunMetrics
+
+	gateway = FakeGateway(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+	counter = RoundTripCounter()
+	query = get_audience_query(channel, size)
+	get_doc = frappe.get_doc
+	# patch the connection itself, not the frappe.db proxy
+	db = frappe.local.db
+
+	def get_bot_or_doc(*args, **kwargs):
+		if args and args[0] == "Raven Bot":
+			return gateway
+		return get_doc(*args, **kwargs)
+
+	with (
+		patch.object(queue, "send_sms", gateway.send_sms),
+		patch.object(frappe, "sendmail", gateway.sendmail),
+		patch.object(frappe, "get_doc", get_bot_or_doc),
+		patch.object(db, "sql", counter.wrap(db.sql)),
+		patch.object(CampaignRunMetrics, "persist", False),
+	):
+		peak_memory = 0
+		if trace_memory:
+			tracemalloc.start()
+			tracemalloc.reset_peak()
+		start = time.perf_counter()
+
+		try:
+			if channel == "SMS":
+				queue.send_sms_queued(query=query, parameters={}, template=TEMPLATE)
+			elif channel == "Email":
+				sms_campaign.send_email(
+					query=query, parameters={}, template=TEMPLATE, subject=SUBJECT, attachments=[]
+				)
+			elif channel == "Raven":
+				campaign = frappe._dict(name=None, raven_bot=gateway.name)
+				sms_campaign.send_raven_message(
+					campaign=campaign, query=query, parameters={}, template=TEMPLATE
+				)
+			else:
+				frappe.throw(f"Benchmark does not support channel {channel}")
+
+			duration = time.perf_counter() - start
+			if trace_memory:
+				peak_memory = tracemalloc.get_traced_memory()[1]
+		finally:
+			if trace_memory:
+				tracemalloc.stop()
+
+	return frappe._dict(
+		channel=channel,
+		rows=size,
+		messages=gateway.calls,
+		failures=gateway.failures,
+		duration=duration,
+		rows_per_second=size / duration if duration else 0,
+		peak_memory_mb=peak_memory / 1024 / 1024,
+		round_trips_per_message=counter.count / gateway.calls if gateway.calls else 0,
+	)
+
+
+def get_audience_query(channel, size):
+	recepient_field = {"SMS": "mobile", "Email": "email", "Raven": "channel_id"}.get(channel)
+	return frappe._dict(
+		query=AUDIENCE_QUERY.format(size=int(size)),
+		recepient_field=recepient_field,
+		cc_emails=None,
+		bcc_emails=None,
+	)
+
+
+def print_results(results):
+	header = f"{'Channel':<8} {'Rows':>10} {'Sent':>10} {'Failed':>8} {'Seconds':>10} {'Rows/s':>10} {'Peak Mem MB':>12} {'DB trips/msg':>13}"
+	print(header)
+	print("-" * len(header))
+	for r in results:
+		print(
+			f"{r.channel:<8} {r.rows:>10} {r.messages - r.failures:>10} {r.failures:>8} "
+			f"{r.duration:>10.2f} {r.rows_per_second:>10.1f} {r.peak_memory_mb:>12.1f} {r.round_trips_per_message:>13.2f}"
+		)
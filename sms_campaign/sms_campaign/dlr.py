@@ -0,0 +1,228 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""Delivery receipt (DLR) ingestion.
+
+Gateways post batches of receipts to `receive`. The request is only checked,
+mapped and pushed onto a Redis list as a single entry. `flush_delivery_receipts`
+runs from the scheduler and bulk upserts the buffered receipts into SMS Delivery
+Status, keyed on the gateway and its message ID. Entries are only dropped from
+the buffer once their upsert is committed.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+
+import frappe
+from frappe.utils import now_datetime
+from frappe.utils.password import get_decrypted_password
+
+DLR_BUFFER_KEY = "sms_campaign:dlr_buffer"
+DLR_TOKEN_KEY = "sms_campaign:dlr_token:"
+NO_TOKEN_CACHE_SECONDS = 300
+# buffer entries (posted batches) upserted per commit
+FLUSH_BATCH_ENTRIES = 5000
+# seconds a flush may keep draining, it runs every minute
+FLUSH_TIME_BUDGET = 45
+UPSERT_CHUNK_SIZE = 1000
+
+
+@frappe.whitelist(allow_guest=True, methods=["POST"])
+def receive(*args, **kwargs):
+	"""Accept a batch of delivery receipts.
+
+	The gateway and token come in the query string, eg.
+	`/api/method/sms_campaign.sms_campaign.dlr.receive?gateway=X&token=Y`. The
+	body is a JSON list of receipts (or a single receipt object, or form fields
+	for gateways that post one receipt per request). Receipt fields are also
+	passed as keyword arguments and ignored here.
+	"""
+	gateway, token = get_request_arg("gateway"), get_request_arg("token")
+	if not gateway:
+		raise frappe.AuthenticationError
+
+	expected = get_dlr_token_hash(gateway)
+	if not expected or not hmac.compare_digest(expected, hash_token(token or "")):
+		raise frappe.AuthenticationError
+
+	receipts = get_request_receipts()
+	fields = get_dlr_fields(gateway)
+	batch = []
+	for receipt in receipts:
+		message_id = receipt.get(fields.message_id)
+		if not message_id:
+			continue
+		batch.append([
+			str(message_id),
+			str(receipt.get(fields.status) or "")[:140],
+			str(receipt.get(fields.error) or "")[:140],
+			str(receipt.get(fields.receiver) or "")[:140],
+		])
+
+	if batch:
+		frappe.cache.rpush(DLR_BUFFER_KEY, json.dumps([gateway, str(now_datetime()), batch]))
+
+	return {"accepted": len(batch)}
+
+
+def get_request_arg(key):
+	# form_dict is built from the body alone for JSON requests
+	value = frappe.request.args.get(key) if frappe.request else None
+	return value or frappe.local.form_dict.get(key)
+
+
+def get_request_receipts():
+	data = frappe.request.get_data(as_text=True) if frappe.request else None
+	if data:
+		try:
+			receipts = json.loads(data)
+		except ValueError:
+			receipts = None
+		if isinstance(receipts, dict):
+			return [receipts]
+		if isinstance(receipts, list):
+			return [r for r in receipts if isinstance(r, dict)]
+
+	return [frappe.local.form_dict]
+
+
+def get_dlr_token_hash(gateway):
+	"""Return the hash of the gateway's DLR token, only the hash is kept in Redis.
+
+	The gateway name comes from an unauthenticated request: names that are
+	not an SMS Gateway are not cached, and a gateway without a token is only
+	cached briefly.
+	"""
+	key = DLR_TOKEN_KEY + gateway
+	token_hash = frappe.cache.get_value(key)
+	if token_hash is not None:
+		return token_hash
+
+	if len(gateway) > 140 or not frappe.db.exists("SMS Gateway", gateway):
+		return ""
+
+	token = get_decrypted_password("SMS Gateway", gateway, "dlr_token", raise_exception=False)
+	token_hash = hash_token(token) if token else ""
+	frappe.cache.set_value(key, token_hash, expires_in_sec=None if token_hash else NO_TOKEN_CACHE_SECONDS)
+	return token_hash
+
+
+def hash_token(token):
+	return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_delivery_status_name(gateway, message_id):
+	"""Message IDs are only unique per gateway."""
+	return hashlib.sha256(f"{gateway}\n{message_id}".encode()).hexdigest()[:32]
+
+
+def get_dlr_fields(gateway):
+	doc = frappe.get_cached_doc("SMS Gateway", gateway)
+	return frappe._dict(
+		message_id=doc.dlr_message_id_field or "id",
+		status=doc.dlr_status_field or "status",
+		error=doc.dlr_error_field or "error_code",
+		receiver=doc.dlr_receiver_field or "phone",
+	)
+
+
+def flush_delivery_receipts():
+	"""Scheduler event: drain the Redis buffer into SMS Delivery Status.
+
+	Flushes batch after batch until the buffer is empty or the time budget
+	is spent, the next run picks up what is left.
+	"""
+	deadline = time.monotonic() + FLUSH_TIME_BUDGET
+	flushed = 0
+	while True:
+		entries, count = flush_batch()
+		flushed += count
+		if len(entries) < FLUSH_BATCH_ENTRIES or time.monotonic() > deadline:
+			return flushed
+
+
+def flush_batch():
+	entries = frappe.cache.lrange(DLR_BUFFER_KEY, 0, FLUSH_BATCH_ENTRIES - 1)
+	receipts = {}
+	for entry in entries:
+		gateway, reported_at, batch = json.loads(entry)
+		for message_id, status, error_code, receiver in batch:
+			# several receipts for one message in a batch: the latest wins
+			receipts[(gateway, message_id)] = {
+				"name": get_delivery_status_name(gateway, message_id),
+				"gateway_message_id": message_id,
+				"gateway": gateway,
+				"status": status,
+				"error_code": error_code,
+				"receiver": receiver,
+				"reported_at": reported_at,
+			}
+
+	if receipts:
+		upsert_delivery_statuses(
+			list(receipts.values()), ("status", "error_code", "reported_at")
+		)
+		frappe.db.commit()
+
+	# receipts pushed meanwhile are appended after the entries read above
+	if entries:
+		frappe.cache.ltrim(DLR_BUFFER_KEY, len(entries), -1)
+
+	return entries, len(receipts)
+
+
+def upsert_delivery_statuses(rows, update_fields):
+	"""Insert SMS Delivery Status rows, updating only `update_fields` of existing ones."""
+	now = now_datetime()
+	user = frappe.session.user if frappe.session else "Administrator"
+	columns = (
+		"name",
+		"gateway_message_id",
+		"gateway",
+		"campaign",
+		"receiver",
+		"status",
+		"error_code",
+		"reported_at",
+		"creation",
+		"modified",
+		"owner",
+		"modified_by",
+	)
+	updates = [*update_fields, "modified", "modified_by"]
+
+	for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+		chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+		values = []
+		for row in chunk:
+			values.extend(row.get(column) for column in columns[:-4])
+			values.extend((now, now, user, user))
+
+		placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))
+		frappe.db.sql(
+			"""insert into `tabSMS Delivery Status` ({columns}) values {placeholders}
+			on duplicate key update {updates}""".format(
+				columns=", ".join(f"`{c}`" for c in columns),
+				placeholders=placeholders,
+				updates=", ".join(f"`{c}` = values(`{c}`)" for c in updates),
+			),
+			values,
+		)
+
+
+def record_sent_message(message_id, gateway, receiver, campaign=None):
+	"""Register a message handed to a gateway so its receipts can be tied back to the campaign."""
+	upsert_delivery_statuses(
+		[{
+			"name": get_delivery_status_name(gateway, message_id),
+			"gateway_message_id": message_id,
+			"gateway": gateway,
+			"campaign": campaign,
+			"receiver": receiver,
+			"status": "Sent",
+		}],
+		# a receipt may already have arrived, keep its status
+		("gateway", "campaign", "receiver"),
+	)
@@ -6,6 +6,16 @@ from frappe.model.document import Document
 from frappe.utils.safe_exec import get_safe_globals
 from frappe.core.doctype.sms_settings.sms_settings import send_sms
 from frappe.utils import cast
+from sms_campaign.sms_campaign.drip import cancel_pending_slices
+from sms_campaign.sms_campaign.queue import (
+	WATERMARK_PARAMETER,
+	get_campaign_data,
+	get_delivery_query,
+	update_watermark,
+)
+from sms_campaign.sms_campaign.metrics import CampaignRunMetrics
+from sms_campaign.sms_campaign.plan import CampaignPlan, get_triggered_plans, invalidate_plans
+from sms_campaign.sms_campaign.segments import prepare_sms
 
 class SMSCampaign(Document):
 	
@@ -19,19 +29,25 @@ class SMSCampaign(Document):
 			})
 	
 	def send_non_triggered_sms(self):
+		self.send_sms(self.get_non_triggered_parameters())
+
+	def get_non_triggered_parameters(self):
 		parameters = {}
 		for param in self.params:
 			parameters[param.label] = param.value
-		self.send_sms(parameters)
+
+		# incremental queries only see rows past the previous run's high-water mark
+		if frappe.db.get_value("SMS Campaign Query", self.query, "incremental"):
+			parameters[WATERMARK_PARAMETER] = self.watermark or None
+
+		return parameters
 
 	def onload(self):
 		if self.trigger_type == "DIRECT" or self.trigger_type == "SCHEDULED":
-			parameters = {}
-			for param in self.params:
-				parameters[param.label] = param.value
+			parameters = self.get_non_triggered_parameters()
 
 			query = frappe.get_doc("SMS Campaign Query", self.query)
-			data = frappe.db.sql(query.query, parameters, as_dict=True)
+			data = get_campaign_data(query, parameters)
 
 			if len(data) < 1:
 				frappe.msgprint("This query does not return any data. Therefore, no parameters and sms list will be shown.", title="No data for selected query")
@@ -44,6 +60,7 @@ class SMSCampaign(Document):
 				row["message"] = frappe.render_template(self.message, get_context(row))
 				rows.append(row)
 			
+			self.set_onload_segments(rows)
 			self.set_onload("rows", rows)
 
 		else:
@@ -54,7 +71,7 @@ class SMSCampaign(Document):
 				parameters[param.label] = param.value
 
 			query = frappe.get_doc("SMS Campaign Query", self.query)
-			data = frappe.db.sql(query.query, parameters, as_dict=True)
+			data = get_campaign_data(query, parameters)
 
 			if len(data) < 1:
 				frappe.msgprint("This query does not return any data. Therefore, no parameters and sms list will be shown.", title="No data for selected query")
@@ -67,8 +84,25 @@ class SMSCampaign(Document):
 				row["message"] = frappe.render_template(self.message, get_context(row))
 				rows.append(row)
 			
+			self.set_onload_segments(rows)
 			self.set_onload("rows", rows)
 
+	def set_onload_segments(self, rows):
+		"""Add encoding and segment counts to the SMS preview so cost blowups show before sending."""
+		if self.channel != "SMS":
+			return
+
+		total_segments = 0
+		unicode_messages = 0
+		for row in rows:
+			row["message"], row["encoding"], row["segments"] = prepare_sms(row["message"], self.transliterate_to_gsm)
+			total_segments += row["segments"]
+			if row["encoding"] == "UCS-2":
+				unicode_messages += 1
+
+		self.set_onload("total_segments", total_segments)
+		self.set_onload("unicode_messages", unicode_messages)
+
 	def update_next_run_date(self):
 		self.last_run_date = frappe.utils.nowdate()
 
@@ -84,12 +118,7 @@ class SMSCampaign(Document):
 
 	
 	def send_triggered_sms(self, doc_name):
-		frappe.db.commit()
-		parameters = {}
-		parameters[frappe.db.get_value("SMS Campaign Query", self.query, "doc_name_field")] = doc_name
-		for param in self.params:
-			parameters[param.label] = param.value
-		self.send_sms(parameters)
+		send_triggered_plan(self.get_plan(), doc_name)
 
 	def on_submit(self):
 		if self.trigger_type == "DIRECT":
@@ -100,60 +129,27 @@ class SMSCampaign(Document):
 			
 		self.save()
 
-	def send_sms(self, parameters):
-		query = frappe.get_doc("SMS Campaign Query", self.query)
+	def on_cancel(self):
+		cancel_pending_slices(self.name)
 
-		doctype = None
-		doctype_ref = None
+	def on_change(self):
+		invalidate_plans()
 
-		if self.attachments:
-			doctype = self.attachments[0].reference_doctype
-			doctype_ref = self.attachments[0].reference_name_field
+	def on_trash(self):
+		invalidate_plans()
 
-		if self.channel == 'SMS':
-			frappe.enqueue(
-				"sms_campaign.sms_campaign.queue.send_sms_queued",
-				queue="default",
-				timeout=4000,
-				query=query,
-				parameters=parameters,
-				template=self.message
-			)
-		elif self.channel == 'Email':
-			send_email(
-				query=query,
-				parameters=parameters,
-				template=self.message,
-				subject=self.email_subject,
-				attachments=self.attachments,
-			)
-		elif self.channel == 'Whatsapp':
-			send_whatsapp_message(
-				query=query,
-				parameters=parameters,
-				template=self.message,
-				subject=self.email_subject,
-				doctype=doctype,
-				reference_name=doctype_ref,
-			)
+	def get_plan(self):
+		return CampaignPlan.from_doc(self, frappe.get_doc("SMS Campaign Query", self.query))
 
-		elif self.channel == 'Raven':
-			if not self.raven_bot:
-				frappe.throw("Please select a Raven Bot for this campaign.")
-			try:
-				send_raven_message(
-					campaign=self,
-					query=query,
-					parameters=parameters,
-					template=self.message,
-					attachments=self.attachments or [],
-					doctype=doctype,
-					reference_name=doctype_ref,
-				)
-			except Exception:
-				frappe.log_error(
-					frappe.get_traceback(), "Raven SMS Campaign Failed"
-				)
+	def send_sms(self, parameters):
+		# profiling is a one-shot switch for the next run only
+		profile = bool(self.profile_next_run)
+		if profile:
+			self.profile_next_run = 0
+			# keep modified, on_submit saves this document again afterwards
+			frappe.db.set_value("SMS Campaign", self.name, "profile_next_run", 0, update_modified=False)
+
+		dispatch_campaign(self.get_plan(), parameters, profile)
 
 		# data = frappe.db.sql(query.query, parameters, as_dict=True)
 		# for row in data:
@@ -202,51 +198,115 @@ def send_sheduled_sms():
 		sms_campaign.update_next_run_date()
 
 def send_triggered_after_insert_sms(doc, method=None):
-	sms_campaigns = frappe.get_all("SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active":1, "trigger": "New", "trigger_doctype": doc.doctype})
-	for sms_campaign in sms_campaigns:
-		sms_campaign = frappe.get_doc("SMS Campaign", sms_campaign.name)
-
-		
-		sms_campaign.send_triggered_sms(doc.name)
+	send_triggered_campaigns(doc, "New")
 
 def send_triggered_on_submit_sms(doc, method=None):
-	sms_campaigns = frappe.get_all("SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active":1, "trigger": "Submit", "trigger_doctype": doc.doctype})
-	for sms_campaign in sms_campaigns:
-		sms_campaign = frappe.get_doc("SMS Campaign", sms_campaign.name)
-		
-		sms_campaign.send_triggered_sms(doc.name)
+	send_triggered_campaigns(doc, "Submit")
 
 def send_triggered_on_cancel_sms(doc, method=None):
-	sms_campaigns = frappe.get_all("SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active":1, "trigger": "Cancel", "trigger_doctype": doc.doctype})
-	for sms_campaign in sms_campaigns:
-		sms_campaign = frappe.get_doc("SMS Campaign", sms_campaign.name)
-
-		
-		sms_campaign.send_triggered_sms(doc.name)
+	send_triggered_campaigns(doc, "Cancel")
 
 
 def send_triggered_on_update_sms(doc, method=None):
-	sms_campaigns = frappe.get_all("SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active":1, "trigger": "Update", "trigger_doctype": doc.doctype})
-	for sms_campaign in sms_campaigns:
-		sms_campaign = frappe.get_doc("SMS Campaign", sms_campaign.name)
-		
-		sms_campaign.send_triggered_sms(doc.name)
-		
+	send_triggered_campaigns(doc, "Update")
 
-	sms_campaigns = frappe.get_all("SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active":1, "trigger": "Value Change", "trigger_doctype": doc.doctype})
-	for sms_campaign in sms_campaigns:
-		campaign = frappe.get_doc("SMS Campaign", sms_campaign.name)
-		
-		if frappe.db.has_column(doc.doctype, campaign.value_changed):
+	for plan in get_triggered_plans(doc.doctype, "Value Change"):
+		if frappe.db.has_column(doc.doctype, plan.value_changed):
 			doc_before_save = doc.get_doc_before_save()
-			field_value_before_save = doc_before_save.get(campaign.value_changed) if doc_before_save else None
+			field_value_before_save = doc_before_save.get(plan.value_changed) if doc_before_save else None
 
-			fieldtype = doc.meta.get_field(campaign.value_changed).fieldtype
-			if cast(fieldtype, doc.get(campaign.value_changed)) == cast(fieldtype, field_value_before_save):
+			fieldtype = doc.meta.get_field(plan.value_changed).fieldtype
+			if cast(fieldtype, doc.get(plan.value_changed)) == cast(fieldtype, field_value_before_save):
 				# value not changed
-				return
-			if doc.get(campaign.value_changed) == campaign.new_value or not campaign.new_value or campaign.new_value == "":
-				campaign.send_triggered_sms(doc.name)
+				continue
+			if doc.get(plan.value_changed) == plan.new_value or not plan.new_value or plan.new_value == "":
+				send_triggered_plan(plan, doc.name)
+
+
+def send_triggered_campaigns(doc, trigger):
+	for plan in get_triggered_plans(doc.doctype, trigger):
+		send_triggered_plan(plan, doc.name)
+
+
+def send_triggered_plan(plan, doc_name):
+	frappe.db.commit()
+	dispatch_campaign(plan, plan.get_parameters(doc_name))
+
+
+def dispatch_campaign(plan, parameters, profile=False):
+	query = plan.get_query()
+	attachments = plan.get_attachments()
+	triggered = plan.trigger_type == "TRIGGERED"
+	# triggered campaigns fire on every document event, only bulk runs are saved
+	persist = not triggered
+
+	doctype = None
+	doctype_ref = None
+
+	if attachments:
+		doctype = attachments[0].reference_doctype
+		doctype_ref = attachments[0].reference_name_field
+
+	if plan.channel == 'SMS':
+		job_queue, timeout = plan.get_job_queue()
+		frappe.enqueue(
+			"sms_campaign.sms_campaign.queue.send_sms_queued",
+			queue=job_queue,
+			timeout=timeout,
+			query=query,
+			parameters=parameters,
+			template=plan.template,
+			campaign=plan.name,
+			profile=profile,
+			transliterate=plan.transliterate,
+			routing=plan.routing,
+			chunk_size=None if triggered else plan.chunk_size,
+			chunk_queue=job_queue,
+			drip=plan.drip and not triggered,
+			persist=persist,
+		)
+	elif plan.channel == 'Email':
+		send_email(
+			query=query,
+			parameters=parameters,
+			template=plan.template,
+			subject=plan.subject,
+			attachments=attachments,
+			campaign=plan.name,
+			profile=profile,
+			persist=persist,
+		)
+	elif plan.channel == 'Whatsapp':
+		send_whatsapp_message(
+			query=query,
+			parameters=parameters,
+			template=plan.template,
+			doctype=doctype,
+			reference_name=doctype_ref,
+			campaign=plan.name,
+			profile=profile,
+			persist=persist,
+		)
+
+	elif plan.channel == 'Raven':
+		if not plan.raven_bot:
+			frappe.throw("Please select a Raven Bot for this campaign.")
+		try:
+			send_raven_message(
+				campaign=frappe._dict(name=plan.name, raven_bot=plan.raven_bot),
+				query=query,
+				parameters=parameters,
+				template=plan.template,
+				attachments=attachments,
+				doctype=doctype,
+				reference_name=doctype_ref,
+				profile=profile,
+				persist=persist,
+			)
+		except Exception:
+			frappe.log_error(
+				frappe.get_traceback(), "Raven SMS Campaign Failed"
+			)
 
 
 def eval_condition(campaign):
@@ -259,65 +319,91 @@ def eval_condition(campaign):
 	return True
 
 			
-def send_email(query, parameters, template, subject, attachments):
-	data = frappe.db.sql(query.query, parameters, as_dict=True)
-	for row in data:
-		email = row[query.recepient_field]
-		bcc = row[query.bcc_emails].split(",") if query.bcc_emails else []
-		cc = row[query.cc_emails].split(",") if query.cc_emails else []
-		msg=frappe.render_template(template, get_context(row))
-		subj = frappe.render_template(subject, get_context(row))
-
-		attachs = []
-
-		for att in attachments:
-			if att.type == 'File':
-				files = frappe.get_all("File", filters ={"file_url": row[att.file_url_field]})
-
-				if len(files) > 0:
-					file = file[0]
-					file_doc = frappe.get_doc("File", file.name)
-
-
-					filename = file_doc.file_name
-
-					file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
-					with open(file_path, "rb") as file_content:
-						attachs.append({"fcontent": file_content.read(), "fname": filename})
-			else:
-				attachs.append({frappe.attach_print(att.print_doctype, row[att.name_query_field], file_name=row[att.name_query_field])})
-		
-		if email:
-			receiver_list = [email]
-			frappe.sendmail(
-				recipients=receiver_list,
-				message=msg,
-				subject=subj,
-				cc=cc,
-				bcc=bcc,
-				attachments=attachs,
-			)
-			frappe.db.commit()
-
-def send_whatsapp_message(query, parameters, template, doctype = None, reference_name = None):
+def send_email(query, parameters, template, subject, attachments, campaign=None, profile=False, persist=True):
+	with CampaignRunMetrics(campaign, "Email", profile, persist) as metrics:
+		with metrics.stage("query"):
+			data = get_campaign_data(get_delivery_query(query), parameters)
+
+		for row in data:
+			metrics.rows += 1
+			email = row[query.recepient_field]
+			bcc = row[query.bcc_emails].split(",") if query.bcc_emails else []
+			cc = row[query.cc_emails].split(",") if query.cc_emails else []
+			with metrics.stage("render"):
+				msg=frappe.render_template(template, get_context(row))
+				subj = frappe.render_template(subject, get_context(row))
+
+			attachs = []
+
+			for att in attachments:
+				if att.type == 'File':
+					files = frappe.get_all("File", filters ={"file_url": row[att.file_url_field]})
+
+					if len(files) > 0:
+						file = file[0]
+						file_doc = frappe.get_doc("File", file.name)
+
+
+						filename = file_doc.file_name
+
+						file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
+						with open(file_path, "rb") as file_content:
+							attachs.append({"fcontent": file_content.read(), "fname": filename})
+				else:
+					attachs.append({frappe.attach_print(att.print_doctype, row[att.name_query_field], file_name=row[att.name_query_field])})
+			
+			if email:
+				receiver_list = [email]
+				try:
+					with metrics.stage("gateway"):
+						frappe.sendmail(
+							recipients=receiver_list,
+							message=msg,
+							subject=subj,
+							cc=cc,
+							bcc=bcc,
+							attachments=attachs,
+						)
+				except Exception:
+					metrics.error()
+					frappe.log_error(frappe.get_traceback(), f"SMS Campaign - Email failed for: {email}")
+					continue
+
+				metrics.sent += 1
+				with metrics.stage("commit"):
+					frappe.db.commit()
+
+		update_watermark(campaign, query, data, metrics.first_error)
+
+def send_whatsapp_message(query, parameters, template, doctype = None, reference_name = None, campaign=None, profile=False, persist=True):
 	"""Send whatsapp message via frappe_whatsapp"""
-	data = frappe.db.sql(query.query, parameters, as_dict=True)
-	for row in data:
-		recipient = format_phone_number(row[query.recepient_field])
-		msg=frappe.render_template(template, get_context(row))
-		bot = frappe.get_doc("WhatsApp Bot", query.whatsapp_bot)
-
-		doc = frappe.get_doc({
-				"doctype": "WhatsApp Message",
-				"to": recipient,
-				"type": "Outgoing",
-				"message_type": "Manual",
-				"reference_doctype": doctype,
-				"reference_name": reference_name,
-				"content_type": "text",
-			})
-
-		doc.save()
+	with CampaignRunMetrics(campaign, "Whatsapp", profile, persist) as metrics:
+		with metrics.stage("query"):
+			data = get_campaign_data(get_delivery_query(query), parameters)
+
+		for row in data:
+			metrics.rows += 1
+			with metrics.stage("format"):
+				recipient = format_phone_number(row[query.recepient_field])
+			with metrics.stage("render"):
+				msg=frappe.render_template(template, get_context(row))
+			bot = frappe.get_doc("WhatsApp Bot", query.whatsapp_bot)
+
+			doc = frappe.get_doc({
+					"doctype": "WhatsApp Message",
+					"to": recipient,
+					"type": "Outgoing",
+					"message_type": "Manual",
+					"reference_doctype": doctype,
+					"reference_name": reference_name,
+					"content_type": "text",
+				})
+
+			with metrics.stage("gateway"):
+				doc.save()
+			metrics.sent += 1
+
+		update_watermark(campaign, query, data)
 
 def _normalize(s: str) -> str:
 	return (s or "").strip()
@@ -325,85 +411,100 @@ def _normalize(s: str) -> str:
 def _normalize_email(s: str) -> str:
 	return (s or "").strip().lower()
 
-def send_raven_message(campaign, query, parameters, template, attachments=None, doctype=None, reference_name=None):
+def send_raven_message(campaign, query, parameters, template, attachments=None, doctype=None, reference_name=None, profile=False, persist=True):
 	attachments = attachments or []
-	data = frappe.db.sql(query.query, parameters, as_dict=True)
+	with CampaignRunMetrics(campaign.name, "Raven", profile, persist) as metrics:
+		with metrics.stage("query"):
+			data = get_campaign_data(get_delivery_query(query), parameters)
 
-	bot = frappe.get_doc("Raven Bot", campaign.raven_bot)
+		bot = frappe.get_doc("Raven Bot", campaign.raven_bot)
 
-	# Native Raven requires bot.raven_user to exist
-	if not getattr(bot, "raven_user", None):
-		frappe.log_error(
-			f"Raven Bot {bot.name} has no raven_user linked. Open the Raven Bot and Save it once.",
-			"Raven SMS Campaign - Bot Misconfigured",
-		)
-		return
-
-	for row in data:
-		recipient = _normalize(row.get(query.recepient_field))
-		if not recipient:
-			continue
-
-		msg = frappe.render_template(template, get_context(row))
-
-		# keep your attachment building (even if not used by RavenBot.send_message directly)
-		attachs = []
-		for att in attachments:
-			if att.type == "File":
-				files = frappe.get_all("File", filters={"file_url": row.get(att.file_url_field)})
-				if files:
-					f = files[0]
-					file_doc = frappe.get_doc("File", f.name)
-					filename = file_doc.file_name
-					file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
-					with open(file_path, "rb") as file_content:
-						attachs.append({"fcontent": file_content.read(), "fname": filename})
-			else:
-				attachs.append(
-					frappe.attach_print(
-						att.print_doctype,
-						row.get(att.name_query_field),
-						file_name=row.get(att.name_query_field),
-					)
-				)
+		# Native Raven requires bot.raven_user to exist
+		if not getattr(bot, "raven_user", None):
+			frappe.log_error(
+				f"Raven Bot {bot.name} has no raven_user linked. Open the Raven Bot and Save it once.",
+				"Raven SMS Campaign - Bot Misconfigured",
+			)
+			return
 
-		common_kwargs = dict(
-			text=msg,
-			markdown=True,
-			link_doctype=doctype,
-			link_document=reference_name,
-		)
+		for row in data:
+			metrics.rows += 1
+			recipient = _normalize(row.get(query.recepient_field))
+			if not recipient:
+				continue
 
-		# DM (native) — Raven creates/gets DM channel internally
-		if "@" in recipient:
-			user_id = _normalize_email(recipient)
+			with metrics.stage("render"):
+				msg = frappe.render_template(template, get_context(row))
+
+			# keep your attachment building (even if not used by RavenBot.send_message directly)
+			attachs = []
+			for att in attachments:
+				if att.type == "File":
+					files = frappe.get_all("File", filters={"file_url": row.get(att.file_url_field)})
+					if files:
+						f = files[0]
+						file_doc = frappe.get_doc("File", f.name)
+						filename = file_doc.file_name
+						file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
+						with open(file_path, "rb") as file_content:
+							attachs.append({"fcontent": file_content.read(), "fname": filename})
+				else:
+					attachs.append(
+						frappe.attach_print(
+							att.print_doctype,
+							row.get(att.name_query_field),
+							file_name=row.get(att.name_query_field),
+						)
+					)
 
-			if not frappe.db.exists("User", user_id):
-				frappe.log_error(f"User not found: {user_id}", "Raven SMS Campaign - Missing User")
-				continue
+			common_kwargs = dict(
+				text=msg,
+				markdown=True,
+				link_doctype=doctype,
+				link_document=reference_name,
+			)
 
-			# ensure Raven User exists + enabled
-			if not frappe.db.get_value(
-				"Raven User",
-				{"type": "User", "user": user_id, "enabled": 1},
-				"name",
-			):
-				frappe.log_error(
-					f"Raven User not found/disabled for: {user_id}",
-					"Raven SMS Campaign - Missing Raven User",
-				)
+			# DM (native) — Raven creates/gets DM channel internally
+			if "@" in recipient:
+				user_id = _normalize_email(recipient)
+
+				# missing users are not retried, they do not hold back the watermark
+				if not frappe.db.exists("User", user_id):
+					frappe.log_error(f"User not found: {user_id}", "Raven SMS Campaign - Missing User")
+					metrics.errors += 1
+					continue
+
+				# ensure Raven User exists + enabled
+				if not frappe.db.get_value(
+					"Raven User",
+					{"type": "User", "user": user_id, "enabled": 1},
+					"name",
+				):
+					frappe.log_error(
+						f"Raven User not found/disabled for: {user_id}",
+						"Raven SMS Campaign - Missing Raven User",
+					)
+					metrics.errors += 1
+					continue
+
+				try:
+					with metrics.stage("gateway"):
+						bot.send_direct_message(user_id=user_id, **common_kwargs)
+					metrics.sent += 1
+				except Exception:
+					metrics.error()
+					frappe.log_error(frappe.get_traceback(), f"Raven DM send failed for: {user_id}")
 				continue
 
 			try:
-				bot.send_direct_message(user_id=user_id, **common_kwargs)
+				with metrics.stage("gateway"):
+					bot.send_message(channel_id=recipient, **common_kwargs)
+				metrics.sent += 1
 			except Exception:
-				frappe.log_error(frappe.get_traceback(), f"Raven DM send failed for: {user_id}")
-			continue
+				metrics.error()
+				frappe.log_error(frappe.get_traceback(), f"Raven Channel send failed for: {recipient}")
 
-		try:
-			bot.send_message(channel_id=recipient, **common_kwargs)
-		except Exception:
-			frappe.log_error(frappe.get_traceback(), f"Raven Channel send failed for: {recipient}")
+		update_watermark(campaign.name, query, data, metrics.first_error)
 
 # def _get_raven_user_name(user_email: str) -> str | None:
 	# In THE system Raven User.name == email
@@ -1,9 +1,53 @@
 # Copyright (c) 2023, Finesoft Afrika and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from sms_campaign.sms_campaign import benchmark, queue
+from sms_campaign.sms_campaign.queue import get_safe_watermark
+
 
 class TestSMSCampaign(FrappeTestCase):
-	pass
+	def test_watermark_stops_before_first_failed_row(self):
+		rows = [{"modified": m} for m in (1, 2, 2, 3, 3, 4)]
+
+		self.assertEqual(get_safe_watermark(rows, "modified"), 4)
+		self.assertEqual(get_safe_watermark(rows, "modified", failed_index=4), 2)
+		# rows sharing the failed row's value are selected again next run
+		self.assertEqual(get_safe_watermark(rows, "modified", failed_index=2), 1)
+		self.assertIsNone(get_safe_watermark(rows, "modified", failed_index=0))
+		self.assertIsNone(get_safe_watermark([], "modified"))
+
+	def test_chunked_send_without_key_column_sends_in_one_job(self):
+		# a query written before key fields existed: no name column, joined
+		# duplicate column names and a trailing comment
+		query = frappe._dict(
+			query="""
+				select a.seq as id, b.seq as id, concat('07', lpad(a.seq, 8, '0')) as mobile
+				from seq_1_to_3 a join seq_1_to_1 b -- every customer
+			""",
+			recepient_field="mobile",
+			key_field="name",
+		)
+
+		with patch.object(queue, "send_sms") as send_sms, patch.object(queue, "create_chunks") as create_chunks:
+			queue.send_sms_queued(query, {}, "Hi", chunk_size=2, persist=False)
+
+		self.assertEqual(send_sms.call_count, 3)
+		create_chunks.assert_not_called()
+
+	def test_benchmark_dispatch(self):
+		runs = frappe.db.count("SMS Campaign Run")
+		for channel in benchmark.CHANNELS:
+			result = benchmark.run_channel(channel, 100, error_rate=0.1, seed=1)
+
+			self.assertEqual(result.messages, 100)
+			self.assertGreater(result.failures, 0)
+			self.assertGreater(result.rows_per_second, 0)
+			self.assertGreater(result.peak_memory_mb, 0)
+
+		# run summaries are not saved by the benchmark
+		self.assertEqual(frappe.db.count("SMS Campaign Run"), runs)
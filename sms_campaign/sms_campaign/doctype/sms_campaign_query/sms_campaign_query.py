@@ -1,8 +1,47 @@
 # Copyright (c) 2023, Finesoft Afrika and contributors
 # For license information, please see license.txt
 
-# import frappe
+import re
+
+import frappe
 from frappe.model.document import Document
+from sms_campaign.sms_campaign.plan import invalidate_plans
+from sms_campaign.sms_campaign.queue import WATERMARK_PARAMETER, get_campaign_data, get_keyed_query
 
 class SMSCampaignQuery(Document):
-	pass
+
+	def validate(self):
+		# these are interpolated into the wrapping select as column names
+		for fieldname in ("key_field", "watermark_field"):
+			value = self.get(fieldname)
+			if value and not re.fullmatch(r"\w+", value):
+				frappe.throw(f"{self.meta.get_label(fieldname)} must be a plain column name.")
+
+		self.validate_result_column("key_field")
+		if self.incremental:
+			self.validate_result_column("watermark_field")
+
+	def validate_result_column(self, fieldname):
+		"""Check that the query can be wrapped and selects the column, without fetching rows."""
+		column = self.get(fieldname)
+		if not column or not self.query:
+			return
+
+		parameters = {param.label: param.value for param in self.params}
+		parameters.setdefault(WATERMARK_PARAMETER, None)
+		if self.doc_name_field:
+			parameters.setdefault(self.doc_name_field, None)
+
+		query = get_keyed_query(frappe._dict(query=self.query), column, columns=f"`{column}`")
+		try:
+			get_campaign_data(frappe._dict(query, query=query.query + " limit 0"), parameters)
+		except Exception as e:
+			frappe.throw(
+				f"{self.meta.get_label(fieldname)} {column} cannot be selected from the query result: {e}"
+			)
+
+	def on_change(self):
+		invalidate_plans()
+
+	def on_trash(self):
+		invalidate_plans()
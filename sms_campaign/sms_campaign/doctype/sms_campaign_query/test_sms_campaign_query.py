@@ -1,9 +1,31 @@
 # Copyright (c) 2023, Finesoft Afrika and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
 
+def make_query(**kwargs):
+	return frappe.get_doc({
+		"doctype": "SMS Campaign Query",
+		"identification": "_Test Key Field Query",
+		"trigger_type": "DIRECT",
+		"channel": "SMS",
+		"recepient_field": "mobile",
+		"query": "select seq as id, concat('07', lpad(seq, 8, '0')) as mobile from seq_1_to_3 -- all",
+		**kwargs,
+	})
+
+
 class TestSMSCampaignQuery(FrappeTestCase):
-	pass
+	def test_key_field_must_be_a_result_column(self):
+		make_query(key_field="id").validate()
+
+		with self.assertRaises(frappe.ValidationError):
+			make_query(key_field="name").validate()
+
+	def test_watermark_field_checked_for_incremental_queries(self):
+		make_query(watermark_field="name").validate()
+
+		with self.assertRaises(frappe.ValidationError):
+			make_query(incremental=1, watermark_field="name").validate()
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+class SMSCampaignRun(Document):
+
+	@staticmethod
+	def clear_old_logs(days=90):
+		table = frappe.qb.DocType("SMS Campaign Run")
+		frappe.db.delete(table, filters=(table.creation < (Now() - Interval(days=days))))
@@ -0,0 +1,31 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from sms_campaign.sms_campaign.doctype.sms_campaign_run.sms_campaign_run import SMSCampaignRun
+from sms_campaign.sms_campaign.metrics import CampaignRunMetrics
+
+
+class TestSMSCampaignRun(FrappeTestCase):
+	def test_run_not_saved_without_persist(self):
+		runs = frappe.db.count("SMS Campaign Run")
+
+		with CampaignRunMetrics(channel="SMS", persist=False) as metrics:
+			metrics.rows += 1
+		self.assertEqual(frappe.db.count("SMS Campaign Run"), runs)
+
+		with CampaignRunMetrics(channel="SMS") as metrics:
+			metrics.rows += 1
+		self.assertEqual(frappe.db.count("SMS Campaign Run"), runs + 1)
+
+	def test_clear_old_logs(self):
+		with CampaignRunMetrics(channel="SMS"):
+			pass
+		old = frappe.get_last_doc("SMS Campaign Run")
+		frappe.db.set_value("SMS Campaign Run", old.name, "creation", add_days(now_datetime(), -100))
+
+		SMSCampaignRun.clear_old_logs(days=90)
+		self.assertFalse(frappe.db.exists("SMS Campaign Run", old.name))
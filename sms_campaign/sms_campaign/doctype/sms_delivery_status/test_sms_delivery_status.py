@@ -0,0 +1,132 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+import json
+from unittest.mock import patch
+
+import frappe
+from frappe.app import make_form_dict
+from frappe.handler import execute_cmd
+from frappe.tests.utils import FrappeTestCase
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from sms_campaign.sms_campaign import dlr
+
+
+class TestSMSDeliveryStatus(FrappeTestCase):
+	def setUp(self):
+		frappe.cache.delete_value(dlr.DLR_BUFFER_KEY)
+
+	def push(self, gateway, *receipts):
+		frappe.cache.rpush(
+			dlr.DLR_BUFFER_KEY, json.dumps([gateway, "2026-10-20 12:00:00", [list(r) for r in receipts]])
+		)
+
+	def test_same_message_id_on_two_gateways(self):
+		self.push("test-gateway-a", ("test-dlr-1", "DELIVRD", "", "254700000001"))
+		self.push("test-gateway-b", ("test-dlr-1", "UNDELIV", "1", "254700000002"))
+
+		self.assertEqual(dlr.flush_delivery_receipts(), 2)
+		self.assertEqual(
+			dict(frappe.get_all(
+				"SMS Delivery Status",
+				filters={"gateway_message_id": "test-dlr-1"},
+				fields=["gateway", "status"],
+				as_list=True,
+			)),
+			{"test-gateway-a": "DELIVRD", "test-gateway-b": "UNDELIV"},
+		)
+		self.assertEqual(frappe.cache.llen(dlr.DLR_BUFFER_KEY), 0)
+
+	def test_failed_flush_keeps_receipts(self):
+		self.push("test-gateway-a", ("test-dlr-2", "DELIVRD", "", "254700000001"))
+
+		with patch.object(dlr, "upsert_delivery_statuses", side_effect=Exception("db down")):
+			with self.assertRaises(Exception):
+				dlr.flush_delivery_receipts()
+
+		self.assertEqual(frappe.cache.llen(dlr.DLR_BUFFER_KEY), 1)
+		self.assertEqual(dlr.flush_delivery_receipts(), 1)
+		self.assertEqual(frappe.cache.llen(dlr.DLR_BUFFER_KEY), 0)
+
+	def test_flush_drains_more_than_one_batch(self):
+		for i in range(5):
+			self.push("test-gateway-a", (f"test-dlr-batch-{i}", "DELIVRD", "", "254700000001"))
+
+		with patch.object(dlr, "FLUSH_BATCH_ENTRIES", 2):
+			self.assertEqual(dlr.flush_delivery_receipts(), 5)
+
+		self.assertEqual(frappe.cache.llen(dlr.DLR_BUFFER_KEY), 0)
+
+	def test_receive_batched_json_post(self):
+		gateway = make_gateway("test-dlr-gateway", "test-dlr-token")
+
+		response = post_receipts(
+			{"gateway": gateway.name, "token": "test-dlr-token"},
+			[
+				{"id": "test-dlr-3", "status": "DELIVRD", "phone": "254700000001"},
+				{"id": "test-dlr-4", "status": "UNDELIV", "error_code": "1", "phone": "254700000002"},
+				{"status": "DELIVRD"},
+			],
+		)
+		self.assertEqual(response, {"accepted": 2})
+
+		self.assertEqual(dlr.flush_delivery_receipts(), 2)
+		self.assertEqual(
+			frappe.db.get_value(
+				"SMS Delivery Status",
+				{"gateway": gateway.name, "gateway_message_id": "test-dlr-4"},
+				["status", "error_code"],
+			),
+			("UNDELIV", "1"),
+		)
+
+	def test_receive_rejects_wrong_token(self):
+		gateway = make_gateway("test-dlr-gateway", "test-dlr-token")
+
+		for args in ({"gateway": gateway.name, "token": "wrong"}, {"gateway": gateway.name}, {}):
+			with self.assertRaises(frappe.AuthenticationError):
+				post_receipts(args, [{"id": "test-dlr-5", "status": "DELIVRD"}])
+
+		self.assertEqual(frappe.cache.llen(dlr.DLR_BUFFER_KEY), 0)
+
+	def test_unknown_gateway_is_not_cached(self):
+		with self.assertRaises(frappe.AuthenticationError):
+			post_receipts({"gateway": "test-no-such-gateway", "token": ""}, [{"id": "test-dlr-6"}])
+
+		self.assertIsNone(frappe.cache.get_value(dlr.DLR_TOKEN_KEY + "test-no-such-gateway"))
+
+
+def make_gateway(name, token):
+	if not frappe.db.exists("SMS Gateway", name):
+		frappe.get_doc({
+			"doctype": "SMS Gateway",
+			"gateway_name": name,
+			"gateway_url": "https://gateway.example.com/send",
+			"message_parameter": "text",
+			"receiver_parameter": "to",
+			"dlr_token": token,
+		}).insert(ignore_permissions=True)
+
+	return frappe.get_doc("SMS Gateway", name)
+
+
+def post_receipts(query_string, receipts):
+	"""Run `receive` the way a gateway's JSON POST reaches it."""
+	request = Request(
+		EnvironBuilder(
+			path="/api/method/sms_campaign.sms_campaign.dlr.receive",
+			method="POST",
+			query_string=query_string,
+			json=receipts,
+		).get_environ()
+	)
+	frappe.local.request = request
+	frappe.local.form_dict = frappe._dict()
+	try:
+		make_form_dict(request)
+		return execute_cmd("sms_campaign.sms_campaign.dlr.receive")
+	finally:
+		frappe.local.request = None
+		frappe.local.form_dict = frappe._dict()
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Finesoft Afrika and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('SMS Drip Slice', {
+	// refresh: function(frm) {
+
+	// }
+});
@@ -0,0 +1,29 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+from datetime import datetime, time
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from sms_campaign.sms_campaign.drip import get_send_plan, get_send_slots, split_keys
+
+
+class TestSMSDripSlice(FrappeTestCase):
+	def test_send_plan_skips_quiet_hours(self):
+		slots = get_send_slots(datetime(2026, 1, 5, 12, 0), time(9), time(17), 60, time(13), time(14))
+		self.assertEqual([s.hour for s in slots], [12, 14, 15, 16])
+
+		plan = get_send_plan(list(range(10)), slots)
+		self.assertEqual([size for *_, size in plan], [2, 3, 2, 3])
+		self.assertEqual([(first, last) for _, first, last, _ in plan], [(0, 1), (2, 4), (5, 6), (7, 9)])
+
+	def test_send_plan_rolls_over_to_next_window(self):
+		slots = get_send_slots(datetime(2026, 1, 5, 18, 0), time(9), time(17), 240)
+		self.assertEqual(slots, [datetime(2026, 1, 6, 9, 0), datetime(2026, 1, 6, 13, 0)])
+
+	def test_split_keys_keeps_equal_keys_together(self):
+		keys = [1, 2, 2, 2, 2, 3, 4, 5]
+		self.assertEqual(split_keys(keys, 4), [(1, 2, 5), None, (3, 3, 1), (4, 5, 2)])
+		self.assertEqual(split_keys([1, 2], 4), [None, (1, 1, 1), None, (2, 2, 1)])
+		self.assertEqual(split_keys([], 2), [None, None])
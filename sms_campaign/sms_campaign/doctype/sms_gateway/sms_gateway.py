@@ -0,0 +1,21 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from sms_campaign.sms_campaign.dlr import DLR_TOKEN_KEY
+
+class SMSGateway(Document):
+
+	def validate(self):
+		if (self.weight or 0) < 0:
+			frappe.throw("Weight cannot be negative.")
+
+		self.routing_prefixes = "\n".join(self.get_prefixes())
+
+	def on_update(self):
+		frappe.cache.delete_value(DLR_TOKEN_KEY + self.name)
+
+	def get_prefixes(self):
+		prefixes = (self.routing_prefixes or "").replace(",", "\n").splitlines()
+		return [p.strip().lstrip("+") for p in prefixes if p.strip()]
@@ -0,0 +1,143 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from sms_campaign.sms_campaign import gateway as gateway_module
+from sms_campaign.sms_campaign.gateway import SMSGatewayError, SMSGatewayRejected, SMSRouter
+
+
+class StubResponse:
+	def __init__(self, status_code=200, body=None):
+		self.status_code = status_code
+		self.body = body
+
+	def raise_for_status(self):
+		if self.status_code >= 400:
+			raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+	def json(self):
+		if self.body is None:
+			raise ValueError
+		return self.body
+
+
+class StubSession:
+	"""Answers every request to a gateway URL with the given response or exception."""
+
+	def __init__(self, outcomes):
+		self.outcomes = outcomes
+		self.calls = []
+
+	def get(self, url, **kwargs):
+		self.calls.append(url)
+		outcome = self.outcomes[url]
+		if isinstance(outcome, Exception):
+			raise outcome
+		return outcome
+
+	post = get
+
+
+def make_gateway(name, **kwargs):
+	return frappe.get_doc({
+		"doctype": "SMS Gateway",
+		"name": name,
+		"gateway_name": name,
+		"enabled": 1,
+		"gateway_url": f"https://{name}.example.com/send",
+		"message_parameter": "text",
+		"receiver_parameter": "to",
+		"cooldown": 60,
+		**kwargs,
+	})
+
+
+class TestSMSGateway(FrappeTestCase):
+	def setUp(self):
+		gateway_module._cooldown_until.clear()
+
+	def send(self, router, outcomes):
+		session = StubSession(outcomes)
+		with patch.object(gateway_module, "get_session", lambda gateway: session):
+			used = router.send("254700000001", "Hello “there”")
+		return used, session.calls
+
+	def test_route_prefers_longest_prefix_then_cost(self):
+		router = SMSRouter(
+			"Cost",
+			gateways=[
+				make_gateway("catch-all", cost_per_segment=0.1),
+				make_gateway("kenya", routing_prefixes="254", cost_per_segment=0.9),
+				make_gateway("safaricom", routing_prefixes="+25470", cost_per_segment=0.5),
+				make_gateway("uganda", routing_prefixes="256", cost_per_segment=0.01),
+			],
+		)
+		self.assertEqual(
+			[g.name for g in router.route("254700000001")], ["safaricom", "kenya", "catch-all"]
+		)
+		self.assertEqual([g.name for g in router.route("256700000001")], ["uganda", "catch-all"])
+
+	def test_route_puts_cooling_gateways_last(self):
+		cheap, dear = make_gateway("cheap", cost_per_segment=0.1), make_gateway("dear", cost_per_segment=1)
+		router = SMSRouter("Cost", gateways=[cheap, dear])
+		gateway_module.start_cooldown(cheap)
+		self.assertEqual([g.name for g in router.route("254700000001")], ["dear", "cheap"])
+
+	def test_send_logs_and_records_message_id(self):
+		gateway = make_gateway("primary", message_id_path="messages.0.id")
+		router = SMSRouter("Cost", gateways=[gateway])
+		response = StubResponse(body={"messages": [{"id": "test-gateway-msg-1"}]})
+
+		used, calls = self.send(router, {gateway.gateway_url: response})
+
+		self.assertEqual(used, "primary")
+		self.assertEqual(calls, [gateway.gateway_url])
+		self.assertTrue(frappe.db.exists("SMS Log", {"message": "Hello “there”"}))
+		self.assertEqual(
+			frappe.db.get_value(
+				"SMS Delivery Status", {"gateway_message_id": "test-gateway-msg-1"}, "gateway"
+			),
+			"primary",
+		)
+
+	def test_send_fails_over_on_connection_and_server_errors(self):
+		down = make_gateway("down", cost_per_segment=0.1)
+		erroring = make_gateway("erroring", cost_per_segment=0.2)
+		healthy = make_gateway("healthy", cost_per_segment=0.3)
+		router = SMSRouter("Cost", gateways=[down, erroring, healthy])
+
+		used, calls = self.send(
+			router,
+			{
+				down.gateway_url: requests.ConnectionError(),
+				erroring.gateway_url: StubResponse(503),
+				healthy.gateway_url: StubResponse(),
+			},
+		)
+
+		self.assertEqual(used, "healthy")
+		self.assertEqual(len(calls), 3)
+		self.assertTrue(gateway_module.is_cooling_down(down))
+		self.assertTrue(gateway_module.is_cooling_down(erroring))
+		self.assertFalse(gateway_module.is_cooling_down(healthy))
+
+	def test_send_does_not_fail_over_on_rejection_or_read_timeout(self):
+		first = make_gateway("first", cost_per_segment=0.1)
+		second = make_gateway("second", cost_per_segment=0.2)
+		router = SMSRouter("Cost", gateways=[first, second])
+
+		outcomes = ((StubResponse(400), SMSGatewayRejected), (requests.ReadTimeout(), requests.ReadTimeout))
+		for outcome, error in outcomes:
+			with self.assertRaises(error):
+				self.send(router, {first.gateway_url: outcome, second.gateway_url: StubResponse()})
+			self.assertFalse(gateway_module.is_cooling_down(first))
+
+	def test_send_without_route(self):
+		router = SMSRouter("Cost", gateways=[make_gateway("uganda", routing_prefixes="256")])
+		with self.assertRaises(SMSGatewayError):
+			self.send(router, {})
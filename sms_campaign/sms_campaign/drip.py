@@ -0,0 +1,304 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""Drip sending: spread a campaign's audience evenly over a delivery window.
+
+The audience is split into time slices up front and each slice is stored as an
+SMS Drip Slice holding the key range of its rows, which are selected again when
+the slice is sent. A per-minute scheduler event enqueues slices once they are
+due. Large audiences sent at once are split the same way (see `create_chunks`),
+with every slice due immediately. Slices of a campaign that has been cancelled or deactivated are not sent.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.utils import get_time, now_datetime
+
+DRIP_QUEUE = "long"
+# a Queued slice no worker has started after this long is queued again
+REQUEUE_AFTER_MINUTES = 30
+# extra time past the job timeout before a Sending slice is given up on
+SENDING_GRACE_SECONDS = 300
+
+
+def in_quiet_hours(moment, quiet_start, quiet_end):
+	if not quiet_start or not quiet_end or quiet_start == quiet_end:
+		return False
+
+	moment = moment.time()
+	if quiet_start < quiet_end:
+		return quiet_start <= moment < quiet_end
+
+	# quiet hours span midnight, eg. 22:00 - 06:00
+	return moment >= quiet_start or moment < quiet_end
+
+
+def get_send_slots(start, window_start, window_end, slice_minutes=15, quiet_start=None, quiet_end=None):
+	"""Return the slice start times of the first delivery window that still has time left after `start`."""
+	step = timedelta(minutes=slice_minutes or 15)
+
+	# start from yesterday's window in case it spans midnight and is still open
+	for offset in range(-1, 2):
+		day = start.date() + timedelta(days=offset)
+		opens = datetime.combine(day, window_start)
+		closes = datetime.combine(day, window_end)
+		if closes <= opens:
+			closes += timedelta(days=1)
+
+		slot = max(opens, start)
+		slots = []
+		while slot < closes:
+			if not in_quiet_hours(slot, quiet_start, quiet_end):
+				slots.append(slot)
+			slot += step
+
+		if slots:
+			return slots
+
+	return []
+
+
+def split_keys(keys, count):
+	"""Split sorted `keys` into `count` contiguous groups of near-equal size.
+
+	Equal keys are never split across groups, so the groups can be selected
+	again by key range. Returns [(first_key, last_key, size) or None] per group.
+	"""
+	groups = []
+	start = 0
+	for i in range(count):
+		end = max(start, (i + 1) * len(keys) // count)
+		while 0 < end < len(keys) and keys[end - 1] == keys[end]:
+			end += 1
+
+		groups.append((keys[start], keys[end - 1], end - start) if end > start else None)
+		start = end
+
+	return groups
+
+
+def get_send_plan(keys, slots):
+	"""Spread the sorted audience `keys` evenly over `slots`. Returns [(send_at, first_key, last_key, size)]."""
+	return [
+		(send_at, *group) for send_at, group in zip(slots, split_keys(keys, len(slots))) if group
+	]
+
+
+def create_drip_plan(campaign, key_field, parameters, keys):
+	settings = frappe.db.get_value(
+		"SMS Campaign",
+		campaign,
+		[
+			"drip_window_start",
+			"drip_window_end",
+			"drip_slice_minutes",
+			"quiet_hours_start",
+			"quiet_hours_end",
+		],
+		as_dict=True,
+	)
+
+	slots = get_send_slots(
+		now_datetime(),
+		get_time(settings.drip_window_start),
+		get_time(settings.drip_window_end),
+		settings.drip_slice_minutes,
+		get_time(settings.quiet_hours_start) if settings.quiet_hours_start else None,
+		get_time(settings.quiet_hours_end) if settings.quiet_hours_end else None,
+	)
+	if not slots:
+		frappe.throw(f"The delivery window of {campaign} has no time outside its quiet hours.")
+
+	# only the key range is kept, the rows are selected again when the slice is sent
+	plan = get_send_plan(keys, slots)
+	plan_id = frappe.generate_hash(length=10)
+	for index, (send_at, first_key, last_key, size) in enumerate(plan):
+		frappe.get_doc({
+			"doctype": "SMS Drip Slice",
+			"campaign": campaign,
+			"plan_id": plan_id,
+			"slice_index": index,
+			"send_at": send_at,
+			"status": "Pending",
+			"recipients": size,
+			"key_field": key_field,
+			"range_start": str(first_key),
+			"range_end": str(last_key),
+			"parameters": frappe.as_json(parameters),
+		}).insert(ignore_permissions=True)
+
+	frappe.db.commit()
+	return plan
+
+
+def create_chunks(campaign, key_field, parameters, keys, chunk_size, queue=DRIP_QUEUE):
+	"""Split the audience into slices of `chunk_size` recipients and queue them all right away."""
+	now = now_datetime()
+	plan_id = frappe.generate_hash(length=10)
+	groups = filter(None, split_keys(keys, -(-len(keys) // chunk_size)))
+	slices = []
+	for index, (first_key, last_key, size) in enumerate(groups):
+		drip_slice = frappe.get_doc({
+			"doctype": "SMS Drip Slice",
+			"campaign": campaign,
+			"plan_id": plan_id,
+			"slice_index": index,
+			"send_at": now,
+			"status": "Pending",
+			"recipients": size,
+			"job_queue": queue,
+			"key_field": key_field,
+			"range_start": str(first_key),
+			"range_end": str(last_key),
+			"parameters": frappe.as_json(parameters),
+		}).insert(ignore_permissions=True)
+		slices.append(drip_slice)
+
+	frappe.db.commit()
+	for drip_slice in slices:
+		enqueue_slice(drip_slice.name, drip_slice.recipients, queue)
+
+	return slices
+
+
+def enqueue_due_slices():
+	"""Scheduler event: hand slices whose time has come to the background workers.
+
+	Also picks up slices left behind by lost jobs: Queued slices that no worker
+	started are queued again, Sending slices whose job must have timed out are
+	marked Failed.
+	"""
+	from sms_campaign.sms_campaign.queue import get_chunk_timeout
+
+	now = now_datetime()
+	due = frappe.get_all(
+		"SMS Drip Slice",
+		filters={"status": "Pending", "send_at": ["<=", now]},
+		fields=["name", "recipients", "job_queue"],
+		order_by="send_at asc",
+	)
+	stale = frappe.get_all(
+		"SMS Drip Slice",
+		filters={"status": "Queued", "modified": ["<", now - timedelta(minutes=REQUEUE_AFTER_MINUTES)]},
+		fields=["name", "recipients", "job_queue"],
+		order_by="send_at asc",
+	)
+	for drip_slice in due + stale:
+		enqueue_slice(drip_slice.name, drip_slice.recipients, drip_slice.job_queue)
+
+	sending = frappe.get_all(
+		"SMS Drip Slice", filters={"status": "Sending"}, fields=["name", "recipients", "modified"]
+	)
+	for drip_slice in sending:
+		timeout = get_chunk_timeout(drip_slice.recipients) + SENDING_GRACE_SECONDS
+		if drip_slice.modified + timedelta(seconds=timeout) < now:
+			frappe.db.set_value("SMS Drip Slice", drip_slice.name, "status", "Failed")
+			frappe.db.commit()
+
+
+def enqueue_slice(slice_name, recipients, queue=None):
+	from sms_campaign.sms_campaign.queue import get_chunk_timeout
+
+	frappe.db.set_value("SMS Drip Slice", slice_name, "status", "Queued")
+	frappe.db.commit()
+	frappe.enqueue(
+		"sms_campaign.sms_campaign.drip.send_drip_slice",
+		queue=queue or DRIP_QUEUE,
+		timeout=get_chunk_timeout(recipients),
+		slice_name=slice_name,
+	)
+
+
+def send_drip_slice(slice_name):
+	from sms_campaign.sms_campaign.queue import send_sms_key_range
+
+	drip_slice = frappe.get_doc("SMS Drip Slice", slice_name)
+	campaign = frappe.get_doc("SMS Campaign", drip_slice.campaign)
+
+	if not campaign.active or campaign.docstatus != 1:
+		frappe.db.set_value("SMS Drip Slice", slice_name, "status", "Cancelled")
+		frappe.db.commit()
+		return
+
+	# a requeued slice may have two jobs, only the first one to get here sends it
+	if frappe.db.get_value("SMS Drip Slice", slice_name, "status", for_update=True) != "Queued":
+		frappe.db.rollback()
+		return
+
+	frappe.db.set_value("SMS Drip Slice", slice_name, "status", "Sending")
+	frappe.db.commit()
+
+	plan = campaign.get_plan()
+	query = plan.get_query()
+	try:
+		complete, watermark = send_sms_key_range(
+			query=query,
+			parameters=json.loads(drip_slice.parameters),
+			key_field=drip_slice.key_field,
+			range_start=drip_slice.range_start,
+			range_end=drip_slice.range_end,
+			template=plan.template,
+			campaign=campaign.name,
+			transliterate=plan.transliterate,
+			routing=plan.routing,
+		)
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.set_value("SMS Drip Slice", slice_name, "status", "Failed")
+		frappe.db.commit()
+		raise
+
+	frappe.db.set_value(
+		"SMS Drip Slice",
+		slice_name,
+		{
+			"status": "Sent" if complete else "Partially Sent",
+			"watermark": str(watermark) if watermark is not None else None,
+		},
+	)
+	frappe.db.commit()
+
+	if query.incremental:
+		advance_watermark(campaign.name, drip_slice.plan_id)
+
+
+def advance_watermark(campaign, plan_id):
+	"""Move the campaign's watermark to the end of the leading delivered slices of a plan.
+
+	Slices finish out of order, a slice only counts once every slice before it
+	has been sent in full.
+	"""
+	from sms_campaign.sms_campaign.queue import set_watermark
+
+	# serialises slices of the campaign finishing at the same time
+	frappe.db.get_value("SMS Campaign", campaign, "watermark", for_update=True)
+
+	slices = frappe.get_all(
+		"SMS Drip Slice",
+		filters={"plan_id": plan_id},
+		fields=["status", "watermark"],
+		order_by="slice_index asc",
+	)
+	watermark = None
+	for drip_slice in slices:
+		if drip_slice.status not in ("Sent", "Partially Sent"):
+			break
+		watermark = drip_slice.watermark or watermark
+		if drip_slice.status != "Sent":
+			break
+
+	if watermark:
+		set_watermark(campaign, watermark)
+	else:
+		frappe.db.commit()
+
+
+def cancel_pending_slices(campaign):
+	frappe.db.set_value(
+		"SMS Drip Slice",
+		{"campaign": campaign, "status": ["in", ("Pending", "Queued")]},
+		"status",
+		"Cancelled",
+	)
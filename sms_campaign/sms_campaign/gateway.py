@@ -0,0 +1,205 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""Routing of campaign SMS across the configured SMS Gateways.
+
+Each gateway keeps a pooled, persistent HTTP session for the life of the worker
+process. A gateway that cannot be reached or answers with a server error is taken
+out of rotation for its cooldown and the message fails over to the next
+candidate; one that answers slower than its slow threshold is cooled down too.
+Read timeouts and 4xx answers do not fail over, the gateway may have accepted
+the message or would reject it anywhere.
+"""
+
+import random
+import time
+
+import frappe
+import requests
+from frappe.core.doctype.sms_settings.sms_settings import create_sms_log
+from requests.adapters import HTTPAdapter
+
+from sms_campaign.sms_campaign.dlr import record_sent_message
+
+ROUTING_STRATEGIES = ("Weight", "Cost")
+
+# per worker process: (gateway name, modified) -> requests.Session
+_sessions = {}
+# gateway name -> time.monotonic() until which it is out of rotation
+_cooldown_until = {}
+
+
+class SMSGatewayError(Exception):
+	pass
+
+
+class SMSGatewayRejected(SMSGatewayError):
+	"""The gateway refused the message itself (4xx), resending will not help."""
+
+
+def get_router(strategy, campaign=None):
+	"""Return an SMSRouter for the campaign's routing strategy, or None to use SMS Settings."""
+	if strategy not in ROUTING_STRATEGIES:
+		return None
+
+	router = SMSRouter(strategy, campaign)
+	if not router.gateways:
+		frappe.log_error(
+			f"No enabled SMS Gateway found for {strategy} routing, falling back to SMS Settings.",
+			"SMS Campaign - No SMS Gateway",
+		)
+		return None
+
+	return router
+
+
+def get_session(gateway):
+	key = (gateway.name, str(gateway.modified))
+	session = _sessions.get(key)
+	if not session:
+		# drop sessions of older versions of this gateway
+		for stale in [k for k in _sessions if k[0] == gateway.name]:
+			_sessions.pop(stale).close()
+
+		session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+		session.mount("http://", adapter)
+		session.mount("https://", adapter)
+		_sessions[key] = session
+
+	return session
+
+
+def is_cooling_down(gateway):
+	return _cooldown_until.get(gateway.name, 0) > time.monotonic()
+
+
+def start_cooldown(gateway):
+	_cooldown_until[gateway.name] = time.monotonic() + (gateway.cooldown or 60)
+
+
+class SMSRouter:
+	def __init__(self, strategy="Weight", campaign=None, gateways=None):
+		self.strategy = strategy
+		self.campaign = campaign
+		if gateways is None:
+			gateways = [
+				frappe.get_doc("SMS Gateway", g.name)
+				for g in frappe.get_all("SMS Gateway", filters={"enabled": 1})
+			]
+		self.gateways = gateways
+		self.prefixes = {g.name: g.get_prefixes() for g in self.gateways}
+
+	def route(self, receiver):
+		"""Return the gateways that can serve `receiver`, best candidate first.
+
+		Gateways with the longest matching prefix come first, gateways without
+		prefixes act as the catch-all. Within that, healthy gateways are ordered
+		by cost or by a weighted random draw.
+		"""
+		candidates = []
+		for gateway in self.gateways:
+			prefixes = self.prefixes[gateway.name]
+			if prefixes:
+				match = max((len(p) for p in prefixes if receiver.startswith(p)), default=None)
+				if match is None:
+					continue
+			else:
+				match = 0
+
+			if self.strategy == "Cost":
+				rank = gateway.cost_per_segment or 0
+			else:
+				# weighted random order (Efraimidis-Spirakis)
+				weight = gateway.weight or 0
+				rank = -(random.random() ** (1 / weight)) if weight else 0
+
+			candidates.append((is_cooling_down(gateway), -match, rank, gateway))
+
+		candidates.sort(key=lambda c: c[:3])
+		return [c[3] for c in candidates]
+
+	def send(self, receiver, msg):
+		"""Send one message, failing over across candidates. Returns the gateway used."""
+		candidates = self.route(receiver)
+		if not candidates:
+			raise SMSGatewayError(f"No SMS Gateway routes to {receiver}")
+
+		for gateway in candidates:
+			start = time.monotonic()
+			try:
+				response = send_via_gateway(gateway, receiver, msg)
+			except requests.HTTPError as e:
+				if e.response is not None and e.response.status_code < 500:
+					raise SMSGatewayRejected(
+						f"SMS Gateway {gateway.name} rejected {receiver}: {e.response.status_code}"
+					) from e
+				start_cooldown(gateway)
+				frappe.log_error(frappe.get_traceback(), f"SMS Gateway {gateway.name} failed")
+				continue
+			except requests.ConnectionError:
+				# includes ConnectTimeout, the request never reached the gateway
+				start_cooldown(gateway)
+				frappe.log_error(frappe.get_traceback(), f"SMS Gateway {gateway.name} failed")
+				continue
+
+			if gateway.slow_threshold and time.monotonic() - start > gateway.slow_threshold:
+				start_cooldown(gateway)
+
+			# create_sms_log decodes the message
+			create_sms_log({"message": frappe.safe_encode(msg), "receiver_list": [receiver]}, [receiver])
+
+			message_id = get_message_id(gateway, response)
+			if message_id:
+				record_sent_message(message_id, gateway.name, receiver, self.campaign)
+
+			return gateway.name
+
+		raise SMSGatewayError(f"All SMS Gateways failed for {receiver}")
+
+
+def send_via_gateway(gateway, receiver, msg):
+	headers = {"Accept": "text/plain, text/html, */*"}
+	params = {}
+	for param in gateway.parameters:
+		if param.header:
+			headers[param.parameter] = param.value
+		else:
+			params[param.parameter] = param.value
+
+	params[gateway.message_parameter] = msg
+	params[gateway.receiver_parameter] = receiver
+
+	session = get_session(gateway)
+	timeout = gateway.timeout or 10
+	if gateway.use_post:
+		if "application/json" in headers.get("Content-Type", ""):
+			response = session.post(gateway.gateway_url, headers=headers, json=params, timeout=timeout)
+		else:
+			response = session.post(gateway.gateway_url, headers=headers, data=params, timeout=timeout)
+	else:
+		response = session.get(gateway.gateway_url, headers=headers, params=params, timeout=timeout)
+
+	response.raise_for_status()
+	return response
+
+
+def get_message_id(gateway, response):
+	"""Pick the gateway message ID out of a JSON send response using the gateway's dotted path."""
+	if not gateway.message_id_path:
+		return None
+
+	try:
+		value = response.json()
+	except ValueError:
+		return None
+
+	for key in gateway.message_id_path.split("."):
+		if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+			value = value[int(key)]
+		elif isinstance(value, dict):
+			value = value.get(key)
+		else:
+			return None
+
+	return str(value) if value not in (None, "") else None
@@ -0,0 +1,129 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+
+import frappe
+
+STAGES = ("query", "render", "format", "gateway", "commit")
+
+
+class CampaignRunMetrics:
+	"""Collects per-stage timings for one campaign run and saves them as an SMS Campaign Run.
+
+	Use as a context manager around a dispatch loop and wrap each hot-path call in
+	`stage(name)`. Time spent in the "gateway" stage is also kept per call for the
+	latency percentiles.
+
+	Set `persist` to False, on the class or per run, to collect the numbers
+	without saving a run.
+	"""
+
+	persist = True
+
+	def __init__(self, campaign=None, channel=None, profile=False, persist=None):
+		if persist is not None:
+			self.persist = persist
+		self.campaign = campaign
+		self.channel = channel
+		self.timings = dict.fromkeys(STAGES, 0.0)
+		self.gateway_latencies = []
+		self.rows = 0
+		self.sent = 0
+		self.errors = 0
+		self.segments = 0
+		self.unicode_messages = 0
+		# index of the first row that failed and may succeed when sent again
+		self.first_error = None
+		self.profiler = cProfile.Profile() if profile else None
+		self.started_at = None
+		self.status = None
+		self._start = None
+
+	def __enter__(self):
+		self.started_at = frappe.utils.now_datetime()
+		self._start = time.perf_counter()
+		if self.profiler:
+			self.profiler.enable()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if self.profiler:
+			self.profiler.disable()
+		if not self.persist:
+			return False
+		try:
+			self.save("Failed" if exc_type else self.status or "Completed")
+		except Exception:
+			frappe.log_error(frappe.get_traceback(), "SMS Campaign - Run Summary Failed")
+		return False
+
+	@contextmanager
+	def stage(self, name):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			elapsed = time.perf_counter() - start
+			self.timings[name] += elapsed
+			if name == "gateway":
+				self.gateway_latencies.append(elapsed)
+
+	def error(self):
+		"""Count a failed send of the current row."""
+		self.errors += 1
+		if self.first_error is None:
+			self.first_error = self.rows - 1
+
+	def as_dict(self):
+		duration = time.perf_counter() - self._start
+		latencies = sorted(self.gateway_latencies)
+
+		summary = {
+			"campaign": self.campaign,
+			"channel": self.channel,
+			"started_at": self.started_at,
+			"finished_at": frappe.utils.now_datetime(),
+			"rows": self.rows,
+			"sent": self.sent,
+			"errors": self.errors,
+			"segments": self.segments,
+			"unicode_messages": self.unicode_messages,
+			"duration": duration,
+			"rows_per_second": self.rows / duration if duration else 0,
+			"gateway_p50": percentile(latencies, 50) * 1000,
+			"gateway_p95": percentile(latencies, 95) * 1000,
+			"gateway_p99": percentile(latencies, 99) * 1000,
+		}
+		for stage, elapsed in self.timings.items():
+			summary[stage + "_time"] = elapsed
+
+		if self.profiler:
+			summary["profile"] = get_profile_stats(self.profiler)
+
+		return summary
+
+	def save(self, status):
+		run = frappe.get_doc({"doctype": "SMS Campaign Run", "status": status, **self.as_dict()})
+		run.insert(ignore_permissions=True)
+		frappe.db.commit()
+		return run
+
+
+def percentile(values, pct):
+	"""Nearest-rank percentile of an already sorted list."""
+	if not values:
+		return 0
+
+	index = max(0, -(-len(values) * pct // 100) - 1)
+	return values[int(index)]
+
+
+def get_profile_stats(profiler, limit=50):
+	stream = io.StringIO()
+	pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+	return stream.getvalue()
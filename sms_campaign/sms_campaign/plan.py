@@ -0,0 +1,174 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""Pre-resolved campaign execution plans.
+
+A CampaignPlan holds everything needed to fire a campaign: query text, bind
+parameters, channel, template and attachment spec. Plans of active triggered
+campaigns are indexed by (trigger doctype, trigger) and cached both in Redis and
+in process, so document events resolve and fire campaigns without touching the
+database. Saving an SMS Campaign or SMS Campaign Query invalidates the cache.
+"""
+
+from typing import NamedTuple
+
+import frappe
+
+from sms_campaign.sms_campaign.queue import (
+	BULK_QUEUE,
+	BULK_TIMEOUT,
+	TRIGGERED_QUEUE,
+	TRIGGERED_TIMEOUT,
+)
+
+PLAN_VERSION_KEY = "sms_campaign:plan_version"
+PLAN_INDEX_KEY = "sms_campaign:triggered_plans"
+
+QUERY_FIELDS = (
+	"name",
+	"query",
+	"doc_name_field",
+	"recepient_field",
+	"cc_emails",
+	"bcc_emails",
+	"whatsapp_bot",
+	"read_from_replica",
+	"replica_max_lag",
+	"incremental",
+	"watermark_field",
+	"key_field",
+)
+ATTACHMENT_FIELDS = (
+	"type",
+	"print_doctype",
+	"name_query_field",
+	"print_format",
+	"file_url_field",
+	"reference_doctype",
+	"reference_name_field",
+)
+
+# site -> (version, index), lives for the worker process
+_local_index = {}
+
+
+class CampaignPlan(NamedTuple):
+	name: str
+	channel: str
+	trigger_type: str
+	trigger: str
+	trigger_doctype: str
+	value_changed: str
+	new_value: str
+	template: str
+	subject: str
+	raven_bot: str
+	job_queue: str
+	chunk_size: int
+	drip: bool
+	transliterate: bool
+	routing: str
+	# ((label, value), ...)
+	params: tuple
+	# ((field, value), ...) per attachment
+	attachments: tuple
+	# ((field, value), ...) of the SMS Campaign Query
+	query: tuple
+
+	@classmethod
+	def from_doc(cls, campaign, query):
+		return cls(
+			name=campaign.name,
+			channel=campaign.channel,
+			trigger_type=campaign.trigger_type,
+			trigger=campaign.trigger,
+			trigger_doctype=campaign.trigger_doctype,
+			value_changed=campaign.value_changed,
+			new_value=campaign.new_value,
+			template=campaign.message,
+			subject=campaign.email_subject,
+			raven_bot=campaign.raven_bot,
+			job_queue=campaign.job_queue,
+			chunk_size=campaign.chunk_size,
+			drip=bool(campaign.drip),
+			transliterate=bool(campaign.transliterate_to_gsm),
+			routing=campaign.sms_gateway_routing,
+			params=tuple((p.label, p.value) for p in campaign.params),
+			attachments=tuple(
+				tuple((f, att.get(f)) for f in ATTACHMENT_FIELDS) for att in campaign.attachments
+			),
+			query=tuple((f, query.get(f)) for f in QUERY_FIELDS),
+		)
+
+	def get_query(self):
+		return frappe._dict(self.query)
+
+	def get_attachments(self):
+		return [frappe._dict(att) for att in self.attachments]
+
+	def get_parameters(self, doc_name=None):
+		parameters = {}
+		if doc_name is not None:
+			parameters[self.get_query().doc_name_field] = doc_name
+		parameters.update(self.params)
+		return parameters
+
+	def get_job_queue(self):
+		"""Return (queue, timeout) for this campaign's send job.
+
+		Triggered campaigns are transactional and go on the short queue, bulk
+		DIRECT and SCHEDULED runs go on the long queue unless overridden.
+		"""
+		if self.trigger_type == "TRIGGERED":
+			return self.job_queue or TRIGGERED_QUEUE, TRIGGERED_TIMEOUT
+
+		return self.job_queue or BULK_QUEUE, BULK_TIMEOUT
+
+
+def get_triggered_plans(doctype, trigger):
+	return get_plan_index().get((doctype, trigger), ())
+
+
+def get_plan_index():
+	version = frappe.cache.get_value(PLAN_VERSION_KEY)
+	if not version:
+		version = frappe.generate_hash(length=10)
+		frappe.cache.set_value(PLAN_VERSION_KEY, version)
+
+	site = frappe.local.site
+	cached = _local_index.get(site)
+	if cached and cached[0] == version:
+		return cached[1]
+
+	cached = frappe.cache.get_value(PLAN_INDEX_KEY)
+	if not cached or cached[0] != version:
+		cached = (version, build_plan_index())
+		frappe.cache.set_value(PLAN_INDEX_KEY, cached)
+
+	_local_index[site] = cached
+	return cached[1]
+
+
+def build_plan_index():
+	index = {}
+	campaigns = frappe.get_all(
+		"SMS Campaign", filters={"trigger_type": "TRIGGERED", "docstatus": 1, "active": 1}, pluck="name"
+	)
+	for name in campaigns:
+		campaign = frappe.get_doc("SMS Campaign", name)
+		query = frappe.get_doc("SMS Campaign Query", campaign.query)
+		plan = CampaignPlan.from_doc(campaign, query)
+		index.setdefault((plan.trigger_doctype, plan.trigger), []).append(plan)
+
+	return {key: tuple(plans) for key, plans in index.items()}
+
+
+def clear_plan_cache():
+	frappe.cache.set_value(PLAN_VERSION_KEY, frappe.generate_hash(length=10))
+	frappe.cache.delete_value(PLAN_INDEX_KEY)
+
+
+def invalidate_plans(doc=None, method=None):
+	"""Drop cached plans once the current transaction is committed."""
+	clear_plan_cache()
+	frappe.db.after_commit.add(clear_plan_cache)
@@ -1,57 +1,316 @@
 import frappe;
 from frappe.core.doctype.sms_settings.sms_settings import send_sms
 from frappe.utils.safe_exec import get_safe_globals
+from sms_campaign.sms_campaign.drip import create_chunks, create_drip_plan
+from sms_campaign.sms_campaign.gateway import SMSGatewayRejected, get_router
+from sms_campaign.sms_campaign.metrics import CampaignRunMetrics
+from sms_campaign.sms_campaign.segments import prepare_sms
 
-def send_sms_queued(query, parameters, template):
+# triggered (transactional) sends must not wait behind bulk campaigns
+TRIGGERED_QUEUE = "short"
+TRIGGERED_TIMEOUT = 300
+BULK_QUEUE = "long"
+BULK_TIMEOUT = 4000
+CHUNK_BASE_TIMEOUT = 300
+CHUNK_SECONDS_PER_ROW = 0.5
+
+# bind parameter holding the previous run's high-water mark for incremental queries
+WATERMARK_PARAMETER = "last_watermark"
+# bind parameters of the key range a slice of the audience re-runs its query for
+RANGE_START_PARAMETER = "sms_campaign_range_start"
+RANGE_END_PARAMETER = "sms_campaign_range_end"
+
+
+class ReplicaLagError(Exception):
+    pass
+
+
+def get_campaign_data(query, parameters, as_dict=True):
+    """Run a campaign query, on the read replica when the query asks for it."""
+    if use_replica(query, parameters):
+        try:
+            return get_campaign_data_from_replica(query, parameters, as_dict)
+        except ReplicaLagError:
+            pass
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "SMS Campaign - Replica Query Failed")
+
+    return frappe.db.sql(query.query, parameters, as_dict=as_dict)
+
+
+def use_replica(query, parameters):
+    if not (query.get("read_from_replica") and frappe.conf.read_from_replica):
+        return False
+
+    # triggered sends query the document that was committed moments ago,
+    # which the replica may not have yet
+    if query.get("doc_name_field") and query.doc_name_field in parameters:
+        return False
+
+    return True
+
+
+@frappe.read_only()
+def get_campaign_data_from_replica(query, parameters, as_dict=True):
+    max_lag = query.get("replica_max_lag") or 0
+    if max_lag:
+        lag = get_replica_lag()
+        if lag is not None and lag > max_lag:
+            raise ReplicaLagError
+
+    return frappe.db.sql(query.query, parameters, as_dict=as_dict)
+
+
+def get_replica_lag():
+    """Seconds the current connection is behind its primary, 0 if it is not a replica.
+
+    Returns None when the lag cannot be read: the site's database user needs
+    the REPLICATION CLIENT (MariaDB 10.5+: SLAVE MONITOR) privilege for it.
+    """
+    try:
+        status = frappe.db.sql("SHOW SLAVE STATUS", as_dict=True)
+    except Exception as e:
+        if is_access_denied(e):
+            return None
+        raise
+
+    if not status:
+        return 0
+
+    lag = status[0].get("Seconds_Behind_Master")
+    # replication stopped or broken
+    if lag is None:
+        raise ReplicaLagError
+
+    return lag
+
+
+def is_access_denied(e):
+    # ER_SPECIFIC_ACCESS_DENIED_ERROR, ER_ACCESS_DENIED_ERROR
+    return bool(getattr(e, "args", None)) and e.args[0] in (1227, 1045)
+
+
+def get_keyed_query(query, key_field, columns="*", key_range=False):
+    """Wrap a campaign query to return its rows ordered by `key_field`.
+
+    With `key_range` only rows whose key lies between the range_start and
+    range_end parameters are returned.
+    """
+    # the newline ends a trailing -- comment before the closing parenthesis
+    sql = "select {columns} from ({query}\n) as campaign_rows".format(
+        columns=columns, query=query.query.strip().rstrip(";")
+    )
+    if key_range:
+        sql += f" where `{key_field}` between %({RANGE_START_PARAMETER})s and %({RANGE_END_PARAMETER})s"
+    sql += f" order by `{key_field}`"
+
+    return frappe._dict(query, query=sql)
+
+
+def get_campaign_keys(query, parameters, key_field):
+    """Return the sorted keys of a campaign's audience without loading the rows."""
+    keyed_query = get_keyed_query(query, key_field, columns=f"`{key_field}`")
+    return [row[0] for row in get_campaign_data(keyed_query, parameters, as_dict=False)]
+
+
+def get_key_range_parameters(parameters, range_start, range_end):
+    return {**parameters, RANGE_START_PARAMETER: range_start, RANGE_END_PARAMETER: range_end}
+
+
+def get_key_field(query):
+    """Column a large audience is split on. Incremental queries split on their watermark."""
+    if query.get("incremental") and query.get("watermark_field"):
+        return query.watermark_field
+
+    return query.get("key_field")
+
+
+def get_delivery_query(query):
+    """Incremental queries are sent in watermark order, so the first failed row bounds the new watermark."""
+    if query.get("incremental") and query.get("watermark_field"):
+        return get_keyed_query(query, query.watermark_field)
+
+    return query
+
+
+def get_safe_watermark(rows, watermark_field, failed_index=None):
+    """Return the highest watermark below which every row of `rows` has been delivered.
+
+    `rows` are in watermark order. Rows sharing the value of the first failed
+    row are not covered, the next run selects them again.
+    """
+    done = rows if failed_index is None else rows[:failed_index]
+    limit = None if failed_index is None else rows[failed_index].get(watermark_field)
+
+    values = [row.get(watermark_field) for row in done]
+    values = [value for value in values if value is not None and (limit is None or value < limit)]
+    return max(values) if values else None
+
+
+def update_watermark(campaign, query, data, failed_index=None):
+    """Advance an incremental campaign's watermark past the rows delivered in this run."""
+    if not campaign or not query.get("incremental") or not query.get("watermark_field"):
+        return
+
+    value = get_safe_watermark(data, query.watermark_field, failed_index)
+    if value is not None:
+        set_watermark(campaign, value)
+
+
+def set_watermark(campaign, value):
+    # bump modified so a form opened before the run cannot save the old watermark back
+    frappe.db.set_value("SMS Campaign", campaign, "watermark", str(value))
+    frappe.db.commit()
+
+
+def send_sms_queued(query, parameters, template, campaign=None, profile=False, transliterate=False, routing=None, chunk_size=None, chunk_queue=BULK_QUEUE, drip=False, persist=True):
+    with CampaignRunMetrics(campaign, "SMS", profile, persist) as metrics:
+        key_field = get_key_field(query)
+        if drip:
+            if not key_field:
+                frappe.throw("Drip sending needs a Key Field on the SMS Campaign Query.")
+            with metrics.stage("query"):
+                keys = get_campaign_keys(query, parameters, key_field)
+            create_drip_plan(campaign, key_field, parameters, keys)
+            metrics.status = "Planned"
+            return
+
+        keys = None
+        if chunk_size and key_field:
+            try:
+                with metrics.stage("query"):
+                    keys = get_campaign_keys(query, parameters, key_field)
+            except Exception:
+                # eg. the key is not a column of the result, send it all in this job
+                frappe.log_error(frappe.get_traceback(), "SMS Campaign - Key Selection Failed")
+
+            if keys and len(keys) > chunk_size:
+                # fan the audience out so no single job has to outlive its timeout
+                create_chunks(campaign, key_field, parameters, keys, chunk_size, chunk_queue)
+                metrics.status = "Chunked"
+                return
+
+        with metrics.stage("query"):
+            data = get_campaign_data(get_delivery_query(query), parameters)
+
+        send_sms_rows(data, query.recepient_field, template, metrics, transliterate, routing)
+        update_watermark(campaign, query, data, metrics.first_error)
+
+
+def send_sms_key_range(query, parameters, key_field, range_start, range_end, template, campaign=None, transliterate=False, routing=None):
+    """Send to the rows of a campaign query whose key lies between `range_start` and `range_end`.
+
+    Returns (complete, watermark): whether every row was delivered and, for
+    incremental queries, the watermark the delivered rows allow.
+    """
+    with CampaignRunMetrics(campaign, "SMS") as metrics:
+        with metrics.stage("query"):
+            rows = get_campaign_data(
+                get_keyed_query(query, key_field, key_range=True),
+                get_key_range_parameters(parameters, range_start, range_end),
+            )
+
+        send_sms_rows(rows, query.recepient_field, template, metrics, transliterate, routing)
+
+        watermark = None
+        if query.get("incremental") and query.get("watermark_field"):
+            watermark = get_safe_watermark(rows, query.watermark_field, metrics.first_error)
+
+        return metrics.first_error is None, watermark
+
+
+def get_chunk_timeout(chunk_size):
+    return CHUNK_BASE_TIMEOUT + int(chunk_size * CHUNK_SECONDS_PER_ROW)
+
+
+def send_sms_rows(rows, recepient_field, template, metrics, transliterate=False, routing=None):
+    router = get_router(routing, metrics.campaign)
+
+    for row in rows:
+        metrics.rows += 1
+        phone = row[recepient_field]
+        with metrics.stage("render"):
+            msg=frappe.render_template(template, get_context(row))
+            msg, encoding, segments = prepare_sms(msg, transliterate)
+        with metrics.stage("format"):
+            phone = format_phone_number(phone)
 
-    data = frappe.db.sql(query.query, parameters, as_dict=True)
-    for row in data:
-        phone = row[query.recepient_field]
-        msg=frappe.render_template(template, get_context(row))
-        phone = format_phone_number(phone)
-        
         if phone:
             receiver_list = [phone]
-            send_sms(receiver_list = receiver_list, msg = msg)
-            frappe.db.commit()
-
-def send_email_queued(query, parameters, template, subject, attachments):
-    data = frappe.db.sql(query.query, parameters, as_dict=True)
-    for row in data:
-        email = row[query.recepient_field]
-        msg=frappe.render_template(template, get_context(row))
-        subj = frappe.render_template(subject, get_context(row))
-
-        attachs = []
-
-        for att in attachments:
-            if att.type == 'File':
-                files = frappe.get_all("File", filters ={"file_url": row[att.file_url_field]})
-
-                if len(files) > 0:
-                    file = file[0]
-                    file_doc = frappe.get_doc("File", file.name)
-
-
-                    filename = file_doc.file_name
-
-                    file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
-                    with open(file_path, "rb") as file_content:
-                        attachs.append({"fcontent": file_content.read(), "fname": filename})
-            else:
-                attachs.append({frappe.attach_print(att.print_doctype, row[att.name_query_field], file_name=row[att.name_query_field])})
-
-        
-        
-        if email:
-            receiver_list = [email]
-            frappe.sendmail(
-                recipients=receiver_list,
-                message=msg,
-                subject=subj,
-                attachments=attachs,
-            )
-            frappe.db.commit()
+            try:
+                with metrics.stage("gateway"):
+                    if router:
+                        router.send(phone, msg)
+                    else:
+                        send_sms(receiver_list = receiver_list, msg = msg)
+            except SMSGatewayRejected:
+                # sending it again would be rejected as well
+                metrics.errors += 1
+                frappe.log_error(frappe.get_traceback(), f"SMS Campaign - Send rejected for: {phone}")
+                continue
+            except Exception:
+                metrics.error()
+                frappe.log_error(frappe.get_traceback(), f"SMS Campaign - Send failed for: {phone}")
+                continue
+
+            metrics.sent += 1
+            metrics.segments += segments
+            if encoding == "UCS-2":
+                metrics.unicode_messages += 1
+            with metrics.stage("commit"):
+                frappe.db.commit()
+
+def send_email_queued(query, parameters, template, subject, attachments, campaign=None, profile=False):
+    with CampaignRunMetrics(campaign, "Email", profile) as metrics:
+        with metrics.stage("query"):
+            data = get_campaign_data(get_delivery_query(query), parameters)
+
+        for row in data:
+            metrics.rows += 1
+            email = row[query.recepient_field]
+            with metrics.stage("render"):
+                msg=frappe.render_template(template, get_context(row))
+                subj = frappe.render_template(subject, get_context(row))
+
+            attachs = []
+
+            for att in attachments:
+                if att.type == 'File':
+                    files = frappe.get_all("File", filters ={"file_url": row[att.file_url_field]})
+
+                    if len(files) > 0:
+                        file = file[0]
+                        file_doc = frappe.get_doc("File", file.name)
+
+
+                        filename = file_doc.file_name
+
+                        file_path = frappe.utils.get_site_path("", file_doc.file_url.lstrip("/"))
+                        with open(file_path, "rb") as file_content:
+                            attachs.append({"fcontent": file_content.read(), "fname": filename})
+                else:
+                    attachs.append({frappe.attach_print(att.print_doctype, row[att.name_query_field], file_name=row[att.name_query_field])})
+
+            
+            
+            if email:
+                receiver_list = [email]
+                try:
+                    with metrics.stage("gateway"):
+                        frappe.sendmail(
+                            recipients=receiver_list,
+                            message=msg,
+                            subject=subj,
+                            attachments=attachs,
+                        )
+                except Exception:
+                    metrics.error()
+                    frappe.log_error(frappe.get_traceback(), f"SMS Campaign - Email failed for: {email}")
+                    continue
+
+                metrics.sent += 1
+                with metrics.stage("commit"):
+                    frappe.db.commit()
 
 
 def format_phone_number(mobile_number):
@@ -0,0 +1,76 @@
+# Copyright (c) 2026, Finesoft Afrika and contributors
+# For license information, please see license.txt
+
+"""SMS encoding and segment counting (GSM 03.38 / UCS-2)."""
+
+import unicodedata
+from functools import lru_cache
+
+GSM7_BASIC = frozenset(
+	"@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+	"¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# extension table characters take two septets (escape + char)
+GSM7_EXTENSION = frozenset("^{}\\[~]|€\f")
+GSM7_CHARS = GSM7_BASIC | GSM7_EXTENSION
+
+GSM7_SINGLE_LIMIT, GSM7_MULTI_LIMIT = 160, 153
+UCS2_SINGLE_LIMIT, UCS2_MULTI_LIMIT = 70, 67
+
+TRANSLITERATIONS = str.maketrans({
+	"‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "`": "'",
+	"“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+	"–": "-", "—": "-", "―": "-", "−": "-",
+	"…": "...", "•": "*", "·": ".",
+	"\u00a0": " ", "\u2009": " ", "\u200b": "", "\t": " ",
+})
+
+
+def is_gsm7(msg):
+	return GSM7_CHARS.issuperset(msg)
+
+
+def get_segments(msg):
+	"""Return (encoding, segments) for a message as the gateway will bill it."""
+	if not msg:
+		return "GSM-7", 0
+
+	if is_gsm7(msg):
+		length = len(msg) + sum(msg.count(char) for char in GSM7_EXTENSION)
+		single, multi, encoding = GSM7_SINGLE_LIMIT, GSM7_MULTI_LIMIT, "GSM-7"
+	else:
+		# characters outside the BMP take two UCS-2 code units
+		length = len(msg.encode("utf-16-le")) // 2
+		single, multi, encoding = UCS2_SINGLE_LIMIT, UCS2_MULTI_LIMIT, "UCS-2"
+
+	if length <= single:
+		return encoding, 1
+
+	return encoding, -(-length // multi)
+
+
+def transliterate(msg):
+	"""Replace characters outside the GSM-7 alphabet with their closest GSM-7 equivalent."""
+	if not msg:
+		return msg
+
+	msg = msg.translate(TRANSLITERATIONS)
+	if is_gsm7(msg):
+		return msg
+
+	return "".join(char if char in GSM7_CHARS else _transliterate_char(char) for char in msg)
+
+
+@lru_cache(maxsize=1024)
+def _transliterate_char(char):
+	decomposed = "".join(c for c in unicodedata.normalize("NFKD", char) if c in GSM7_CHARS)
+	return decomposed or "?"
+
+
+def prepare_sms(msg, transliterate_to_gsm=False):
+	"""Post-process a rendered SMS. Returns (msg, encoding, segments)."""
+	if transliterate_to_gsm:
+		msg = transliterate(msg)
+
+	encoding, segments = get_segments(msg)
+	return msg, encoding, segments
@@ -0,0 +1,84 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from sms_campaign.sms_campaign import plan
+from sms_campaign.sms_campaign.plan import get_triggered_plans
+
+
+def get_plans():
+	return {p.name: p for p in get_triggered_plans("ToDo", "New")}
+
+
+class TestCampaignPlan(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("SMS Campaign", {"identifier": "_Test Plan Campaign"})
+		frappe.db.delete("SMS Campaign Query", {"identification": "_Test Plan Query"})
+		plan.clear_plan_cache()
+		plan._local_index.clear()
+
+		self.query = frappe.get_doc({
+			"doctype": "SMS Campaign Query",
+			"identification": "_Test Plan Query",
+			"trigger_type": "TRIGGERED",
+			"channel": "SMS",
+			"doc_name_field": "todo",
+			"recepient_field": "mobile",
+			"query": "select '0700000001' as mobile from `tabToDo` where name = %(todo)s",
+		}).insert()
+		self.campaign = frappe.get_doc({
+			"doctype": "SMS Campaign",
+			"identifier": "_Test Plan Campaign",
+			"query": self.query.name,
+			"active": 1,
+			"trigger_type": "TRIGGERED",
+			"trigger": "New",
+			"trigger_doctype": "ToDo",
+			"channel": "SMS",
+			"message": "Hello",
+		}).insert()
+		self.campaign.submit()
+
+	def test_saving_campaign_or_query_changes_plans(self):
+		self.assertFalse(get_plans()[self.campaign.name].transliterate)
+
+		self.campaign.reload()
+		self.campaign.transliterate_to_gsm = 1
+		self.campaign.save()
+		self.assertTrue(get_plans()[self.campaign.name].transliterate)
+
+		self.query.recepient_field = "phone"
+		self.query.save()
+		self.assertEqual(get_plans()[self.campaign.name].get_query().recepient_field, "phone")
+
+		self.campaign.reload()
+		self.campaign.active = 0
+		self.campaign.save()
+		self.assertNotIn(self.campaign.name, get_plans())
+
+	def test_cached_plan_needs_no_queries(self):
+		get_plans()
+
+		db = frappe.local.db
+		with patch.object(db, "sql", side_effect=AssertionError("plan lookup queried the database")):
+			campaign_plan = get_plans()[self.campaign.name]
+			self.assertEqual(campaign_plan.get_parameters("TODO-0001")["todo"], "TODO-0001")
+
+	def test_rebuild_after_commit_sees_committed_values(self):
+		self.campaign.reload()
+		self.campaign.transliterate_to_gsm = 1
+		self.campaign.save()
+
+		# another worker rebuilt the index from the old values before this commit
+		version = frappe.cache.get_value(plan.PLAN_VERSION_KEY)
+		stale = {("ToDo", "New"): (get_plans()[self.campaign.name]._replace(transliterate=False),)}
+		frappe.cache.set_value(plan.PLAN_INDEX_KEY, (version, stale))
+		plan._local_index[frappe.local.site] = (version, stale)
+		self.assertFalse(get_plans()[self.campaign.name].transliterate)
+
+		frappe.db.after_commit.run()
+		self.assertTrue(get_plans()[self.campaign.name].transliterate)
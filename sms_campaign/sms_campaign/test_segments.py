@@ -0,0 +1,43 @@
+# Copyright (c) 2026, Finesoft Afrika and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from sms_campaign.sms_campaign.segments import get_segments, prepare_sms, transliterate
+
+
+class TestSegments(FrappeTestCase):
+	def test_gsm7_single_segment_boundary(self):
+		self.assertEqual(get_segments("a" * 160), ("GSM-7", 1))
+		self.assertEqual(get_segments("a" * 161), ("GSM-7", 2))
+		self.assertEqual(get_segments("a" * 306), ("GSM-7", 2))
+		self.assertEqual(get_segments("a" * 307), ("GSM-7", 3))
+		self.assertEqual(get_segments(""), ("GSM-7", 0))
+
+	def test_gsm7_extension_chars_take_two_septets(self):
+		self.assertEqual(get_segments("€" * 80), ("GSM-7", 1))
+		self.assertEqual(get_segments("a" + "€" * 80), ("GSM-7", 2))
+		self.assertEqual(get_segments("a" * 159 + "{"), ("GSM-7", 2))
+
+	def test_ucs2_boundary(self):
+		self.assertEqual(get_segments("ç" * 70), ("UCS-2", 1))
+		self.assertEqual(get_segments("ç" * 71), ("UCS-2", 2))
+		self.assertEqual(get_segments("ç" * 134), ("UCS-2", 2))
+		self.assertEqual(get_segments("ç" * 135), ("UCS-2", 3))
+
+	def test_ucs2_surrogate_pairs(self):
+		# emoji outside the BMP take two UCS-2 code units each
+		self.assertEqual(get_segments("😀" * 35), ("UCS-2", 1))
+		self.assertEqual(get_segments("a" + "😀" * 35), ("UCS-2", 2))
+
+	def test_transliteration(self):
+		self.assertEqual(transliterate("Hi “you” – it’s…"), 'Hi "you" - it\'s...')
+		self.assertEqual(transliterate("café ç ü"), "café c ü")
+		self.assertEqual(transliterate("😀"), "?")
+		self.assertEqual(transliterate(""), "")
+
+		msg, encoding, segments = prepare_sms("ç" * 100, transliterate_to_gsm=True)
+		self.assertEqual((msg, encoding, segments), ("c" * 100, "GSM-7", 1))
+
+		msg, encoding, segments = prepare_sms("ç" * 100)
+		self.assertEqual((encoding, segments), ("UCS-2", 2))